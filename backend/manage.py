@@ -0,0 +1,251 @@
+"""Maintenance commands for the Disk Entulho backend.
+
+Usage (from the backend directory, with the same .env as the API):
+
+    python manage.py migrate-dates [--batch-size 500] [--collection rental_notes]
+    python manage.py backfill-locations [--batch-size 500]
+    python manage.py geocode-backfill [--batch-size 500] [--concurrency 8]
+    python manage.py dedupe-receivables [--dry-run]
+    python manage.py rebuild-stats
+    python manage.py backfill-updated-at
+    python manage.py backfill-search-terms [--batch-size 500]
+    python manage.py rebuild-dumpsters
+"""
+import argparse
+import asyncio
+import logging
+
+from pymongo import UpdateOne
+
+from server import (
+    client, db, gazetteer, Client, DATETIME_FIELDS, GAZETTEER_PATH, INDEXES, SYNC_MODELS,
+    client_document, ensure_collection_indexes, parse_iso_datetime, parse_from_mongo, geo_point,
+    rebuild_dumpsters, rebuild_stats, record_tombstone, rental_note_search_terms, run_geocode_backfill
+)
+
+logger = logging.getLogger("manage")
+
+
+async def migrate_collection_dates(collection_name: str, batch_size: int):
+    """Convert ISO string datetime fields of one collection to BSON dates.
+
+    Only documents that still hold a string in one of the datetime fields are
+    selected, so an interrupted run resumes where it stopped when started again.
+    """
+    fields = DATETIME_FIELDS[collection_name]
+    collection = db[collection_name]
+    pending = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    
+    converted = 0
+    skipped = 0
+    last_id = None
+    while True:
+        query = pending if last_id is None else {"$and": [pending, {"_id": {"$gt": last_id}}]}
+        batch = await collection.find(query, {field: 1 for field in fields}) \
+            .sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not batch:
+            break
+        
+        operations = []
+        for doc in batch:
+            update = {}
+            for field in fields:
+                value = doc.get(field)
+                if isinstance(value, str):
+                    try:
+                        update[field] = parse_iso_datetime(value)
+                    except ValueError:
+                        logger.warning("%s %s: unparseable %s=%r", collection_name, doc["_id"], field, value)
+            if update:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+            else:
+                skipped += 1
+        
+        if operations:
+            result = await collection.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+        last_id = batch[-1]["_id"]
+        logger.info("%s: %d converted, %d skipped", collection_name, converted, skipped)
+    
+    return converted, skipped
+
+
+async def migrate_dates(collections, batch_size: int):
+    for collection_name in collections:
+        converted, skipped = await migrate_collection_dates(collection_name, batch_size)
+        print(f"{collection_name}: {converted} documents converted, {skipped} skipped")
+
+
+async def backfill_locations(batch_size: int):
+    """Set the GeoJSON location of rental notes that only have latitude/longitude.
+
+    Notes that already have a location are not selected again, so the command
+    can be interrupted and re-run. Pairs the 2dsphere index would reject (out
+    of range or NaN) are left without a location.
+    """
+    pending = {
+        "latitude": {"$type": "number", "$gte": -90, "$lte": 90},
+        "longitude": {"$type": "number", "$gte": -180, "$lte": 180},
+        "location": {"$exists": False}
+    }
+    updated = 0
+    while True:
+        batch = await db.rental_notes.find(pending, {"latitude": 1, "longitude": 1}) \
+            .limit(batch_size).to_list(length=None)
+        if not batch:
+            break
+        operations = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"location": geo_point(doc["latitude"], doc["longitude"])}})
+            for doc in batch
+        ]
+        result = await db.rental_notes.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+        logger.info("rental_notes: %d locations set", updated)
+    print(f"rental_notes: {updated} locations set")
+
+
+async def geocode_backfill(batch_size: int, concurrency: int):
+    if GAZETTEER_PATH.exists():
+        gazetteer.load(GAZETTEER_PATH)
+    progress = await run_geocode_backfill(batch_size, concurrency)
+    print(f"geocode-backfill {progress['status']}: {progress['processed']} processed, "
+          f"{progress['updated']} updated, {progress['not_found']} not found")
+
+
+async def dedupe_receivables(dry_run: bool):
+    """Remove duplicate receivables recorded for the same rental note.
+
+    Concurrent payments used to record a receivable per request; the oldest
+    one is kept. Afterwards the unique rental_note_id index can be built.
+    """
+    duplicates = db.receivables.aggregate([
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {
+            "_id": "$rental_note_id",
+            "ids": {"$push": {"_id": "$_id", "id": "$id"}},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True)
+    
+    notes = 0
+    removed = 0
+    async for group in duplicates:
+        extra = group["ids"][1:]
+        notes += 1
+        removed += len(extra)
+        if not dry_run:
+            await db.receivables.delete_many({"_id": {"$in": [doc["_id"] for doc in extra]}})
+            for doc in extra:
+                await record_tombstone("receivables", doc["id"])
+    
+    if dry_run:
+        print(f"receivables: {removed} duplicates for {notes} rental notes would be removed")
+        return
+    await ensure_collection_indexes("receivables", INDEXES["receivables"])
+    print(f"receivables: {removed} duplicates for {notes} rental notes removed")
+
+
+async def rebuild_rental_stats():
+    clients = await rebuild_stats()
+    print(f"stats: rental counters rebuilt for {clients} clients")
+
+
+async def backfill_updated_at():
+    """Stamp updated_at on documents written before it existed, from their created_at.
+
+    Only documents without updated_at are selected, so the command can be re-run.
+    """
+    for collection_name in SYNC_MODELS:
+        result = await db[collection_name].update_many(
+            {"updated_at": {"$exists": False}},
+            [{"$set": {"updated_at": "$created_at"}}]
+        )
+        print(f"{collection_name}: {result.modified_count} documents stamped")
+
+
+async def backfill_search_terms(batch_size: int):
+    """Compute the search terms of clients and rental notes written before search existed.
+
+    Documents that already have terms are not selected again, so the command
+    can be interrupted and re-run.
+    """
+    builders = {
+        "clients": lambda doc: client_document(Client(**parse_from_mongo(doc)))["search_terms"],
+        "rental_notes": rental_note_search_terms
+    }
+    for collection_name, build_terms in builders.items():
+        collection = db[collection_name]
+        updated = 0
+        while True:
+            batch = await collection.find({"search_terms": {"$exists": False}}) \
+                .limit(batch_size).to_list(length=None)
+            if not batch:
+                break
+            operations = [
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"search_terms": build_terms(doc)}})
+                for doc in batch
+            ]
+            result = await collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            logger.info("%s: %d documents indexed for search", collection_name, updated)
+        print(f"{collection_name}: {updated} documents indexed for search")
+
+
+async def rebuild_dumpster_inventory():
+    count = await rebuild_dumpsters()
+    print(f"dumpsters: inventory rebuilt for {count} codes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    migrate = subparsers.add_parser("migrate-dates", help="Convert ISO string dates to native BSON dates")
+    migrate.add_argument("--batch-size", type=int, default=500)
+    migrate.add_argument("--collection", choices=sorted(DATETIME_FIELDS), action="append",
+                         help="Collection to migrate (repeatable, default: all)")
+    
+    backfill = subparsers.add_parser("backfill-locations", help="Set GeoJSON location from latitude/longitude")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    
+    geocode = subparsers.add_parser("geocode-backfill", help="Geocode rental notes without coordinates")
+    geocode.add_argument("--batch-size", type=int, default=500)
+    geocode.add_argument("--concurrency", type=int, default=8)
+    
+    dedupe = subparsers.add_parser("dedupe-receivables", help="Remove duplicate receivables per rental note")
+    dedupe.add_argument("--dry-run", action="store_true")
+    
+    subparsers.add_parser("rebuild-stats", help="Recompute the rental counters from rental_notes")
+    
+    subparsers.add_parser("backfill-updated-at", help="Set updated_at from created_at where missing")
+    
+    search = subparsers.add_parser("backfill-search-terms", help="Compute search terms where missing")
+    search.add_argument("--batch-size", type=int, default=500)
+    
+    subparsers.add_parser("rebuild-dumpsters", help="Recompute the dumpster inventory from rental_notes")
+    
+    args = parser.parse_args()
+    try:
+        if args.command == "migrate-dates":
+            asyncio.run(migrate_dates(args.collection or list(DATETIME_FIELDS), args.batch_size))
+        elif args.command == "backfill-locations":
+            asyncio.run(backfill_locations(args.batch_size))
+        elif args.command == "geocode-backfill":
+            asyncio.run(geocode_backfill(args.batch_size, args.concurrency))
+        elif args.command == "dedupe-receivables":
+            asyncio.run(dedupe_receivables(args.dry_run))
+        elif args.command == "rebuild-stats":
+            asyncio.run(rebuild_rental_stats())
+        elif args.command == "backfill-updated-at":
+            asyncio.run(backfill_updated_at())
+        elif args.command == "backfill-search-terms":
+            asyncio.run(backfill_search_terms(args.batch_size))
+        elif args.command == "rebuild-dumpsters":
+            asyncio.run(rebuild_dumpster_inventory())
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,64 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, GEOSPHERE, TEXT, IndexModel, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field, ValidationError
+from typing import AsyncIterator, Iterable, List, Optional, Dict
 import uuid
+import json
+import orjson
+import base64
+import asyncio
+import bisect
+import hashlib
+import time
+import re
+import csv
+import io
+import codecs
+import unicodedata
+import functools
 from datetime import datetime, timezone, timedelta
 from enum import Enum
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+import numpy as np
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware: BSON dates come back as UTC-aware datetimes straight from the driver
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Change watermarks
+_last_updated_at: Optional[datetime] = None
+
+def next_updated_at() -> datetime:
+    """Current UTC time at BSON (millisecond) precision, strictly increasing in this process"""
+    global _last_updated_at
+    now = datetime.now(timezone.utc)
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    if _last_updated_at is not None and now <= _last_updated_at:
+        now = _last_updated_at + timedelta(milliseconds=1)
+    _last_updated_at = now
+    return now
+
 # Enums
 class DumpsterSize(str, Enum):
     PEQUENA = "Pequena"
@@ -36,6 +69,14 @@ class RentalStatus(str, Enum):
     ACTIVE = "active"
     RETRIEVED = "retrieved"
 
+class DumpsterStatus(str, Enum):
+    AVAILABLE = "available"
+    RENTED = "rented"
+
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
 # Models
 class Client(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -47,6 +88,7 @@ class Client(BaseModel):
     additional_address: Optional[str] = ""
     notes: Optional[str] = ""
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=next_updated_at)
 
 class ClientCreate(BaseModel):
     name: str
@@ -57,6 +99,11 @@ class ClientCreate(BaseModel):
     additional_address: Optional[str] = ""
     notes: Optional[str] = ""
 
+class ClientImport(ClientCreate):
+    """A client as exported, keeping its id so imported rental notes still match"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 class ClientUpdate(BaseModel):
     name: Optional[str] = None
     address: Optional[str] = None
@@ -72,10 +119,27 @@ class DumpsterType(BaseModel):
     volume: str
     price: float
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=next_updated_at)
 
 class DumpsterTypeUpdate(BaseModel):
     price: float
 
+class Dumpster(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    code: str
+    size: Optional[DumpsterSize] = None
+    status: DumpsterStatus = DumpsterStatus.AVAILABLE
+    current_rental_id: Optional[str] = None
+    # Last known position: where the current or last rental was placed
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=next_updated_at)
+
+class DumpsterCreate(BaseModel):
+    code: str
+    size: Optional[DumpsterSize] = None
+
 class RentalNote(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_id: Optional[str] = None  # Optional for unregistered clients
@@ -93,6 +157,7 @@ class RentalNote(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=next_updated_at)
 
 class RentalNoteCreate(BaseModel):
     client_id: Optional[str] = None  # Optional for unregistered clients
@@ -104,9 +169,16 @@ class RentalNoteCreate(BaseModel):
     rental_date: datetime
     description: Optional[str] = ""
     price: float
-    # Map coordinates (optional)
-    latitude: Optional[float] = None
-    longitude: Optional[float] = None
+    # Map coordinates (optional); the 2dsphere index rejects out-of-range points
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+class RentalNoteImport(RentalNoteCreate):
+    """A rental note as exported, keeping its history when imported again"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    status: RentalStatus = RentalStatus.ACTIVE
+    is_paid: bool = False
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Payment(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -115,6 +187,7 @@ class Payment(BaseModel):
     due_date: datetime
     description: Optional[str] = ""
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=next_updated_at)
 
 class PaymentCreate(BaseModel):
     account_name: str
@@ -131,6 +204,7 @@ class Receivable(BaseModel):
     amount: float
     received_date: datetime
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=next_updated_at)
 
 class Landfill(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -179,6 +253,7 @@ class RouteCreate(BaseModel):
     start_longitude: float
     landfill_id: str
     rental_note_ids: List[str]
+    optimize: bool = True  # False keeps the order of rental_note_ids
 
 class ReceivableCreate(BaseModel):
     client_id: Optional[str] = None
@@ -192,24 +267,324 @@ class ReportRequest(BaseModel):
     start_date: datetime
     end_date: datetime
 
+# Datetime fields stored as native BSON dates, per collection
+DATETIME_FIELDS = {
+    "clients": ["created_at", "updated_at"],
+    "dumpster_types": ["created_at", "updated_at"],
+    "rental_notes": ["rental_date", "created_at", "updated_at"],
+    "payments": ["due_date", "created_at", "updated_at"],
+    "receivables": ["received_date", "created_at", "updated_at"],
+    "dumpsters": ["created_at", "updated_at"],
+    "landfills": ["created_at"],
+    "waypoints": ["created_at"],
+    "routes": ["created_date"],
+}
+DATETIME_FIELD_NAMES = {field for fields in DATETIME_FIELDS.values() for field in fields}
+
 # Helper functions
+def parse_iso_datetime(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
 def prepare_for_mongo(data):
+    # Datetimes are stored as native BSON dates; naive values are taken as UTC
     if isinstance(data, dict):
         for key, value in data.items():
-            if isinstance(value, datetime):
-                data[key] = value.isoformat()
+            if isinstance(value, datetime) and value.tzinfo is None:
+                data[key] = value.replace(tzinfo=timezone.utc)
     return data
 
 def parse_from_mongo(item):
+    # BSON dates are decoded by the driver; only documents not yet converted
+    # by `python manage.py migrate-dates` still hold ISO strings.
     if isinstance(item, dict):
-        for key, value in item.items():
-            if isinstance(value, str) and 'T' in value and ('Z' in value or '+' in value):
+        for key in DATETIME_FIELD_NAMES:
+            value = item.get(key)
+            if isinstance(value, str):
                 try:
-                    item[key] = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                except:
+                    item[key] = parse_iso_datetime(value)
+                except ValueError:
                     pass
     return item
 
+# Pagination helpers
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    """Encode the (sort_field, id) position of a document as an opaque cursor"""
+    value = doc.get(sort_field)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([value, doc["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor: str, sort_field: str):
+    try:
+        value, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort_field in DATETIME_FIELD_NAMES and value is not None:
+            value = parse_iso_datetime(value)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+    return value, doc_id
+
+def page_cursor(collection, query: dict, limit: Optional[int] = None, after: Optional[str] = None,
+                order: SortOrder = SortOrder.ASC, sort_field: str = "created_at",
+                projection: Optional[dict] = None):
+    """Cursor over one keyset page of (sort_field, id)"""
+    direction = 1 if order == SortOrder.ASC else -1
+    page_query = query
+    if after:
+        value, doc_id = decode_cursor(after, sort_field)
+        op = "$gt" if direction == 1 else "$lt"
+        page_query = {"$and": [query, {"$or": [
+            {sort_field: {op: value}},
+            {sort_field: value, "id": {op: doc_id}}
+        ]}]}
+    
+    cursor = collection.find(page_query, projection or {"_id": 0}) \
+        .sort([(sort_field, direction), ("id", direction)])
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+async def find_page(collection, query: dict, response: Response, limit: Optional[int] = None,
+                    after: Optional[str] = None, order: SortOrder = SortOrder.ASC,
+                    sort_field: str = "created_at", projection: Optional[dict] = None):
+    """Keyset pagination over (sort_field, id).
+
+    On the first page (no ``after``) sets X-Total-Count with the number of
+    documents matching ``query``; an empty query uses the collection metadata
+    count, so its cost does not grow with the collection. When the page is
+    full, X-Next-Cursor is set with the cursor to pass as ``after``.
+    """
+    cursor = page_cursor(collection, query, limit, after, order, sort_field, projection)
+    if limit and not after:
+        count = collection.count_documents(query) if query else collection.estimated_document_count()
+        total, docs = await asyncio.gather(count, cursor.to_list(length=None))
+    else:
+        docs = await cursor.to_list(length=None)
+        # Without a limit the first page is the whole result
+        total = None if after else len(docs)
+    
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    if limit and len(docs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(docs[-1], sort_field)
+    return docs
+
+# NDJSON streaming
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_BATCH_SIZE = 500
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def accepts_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+async def iter_ndjson(cursor, transform=None) -> AsyncIterator[bytes]:
+    """Serialize documents from a Motor cursor one line each, in chunks"""
+    lines = []
+    async for doc in cursor.batch_size(NDJSON_BATCH_SIZE):
+        if transform:
+            doc = transform(doc)
+        lines.append(orjson.dumps(doc, default=json_default))
+        if len(lines) >= 100:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def ndjson_response(cursor, transform=None) -> StreamingResponse:
+    """Stream a cursor as NDJSON; memory use does not depend on the result size"""
+    return StreamingResponse(iter_ndjson(cursor, transform), media_type=NDJSON_MEDIA_TYPE)
+
+# Trusted documents fast path
+@functools.lru_cache(maxsize=None)
+def model_projection(model) -> dict:
+    """Projection of the fields of ``model``, without _id"""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+@functools.lru_cache(maxsize=None)
+def model_defaults(model) -> dict:
+    return {
+        name: field.default
+        for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+def from_trusted(doc: dict, model) -> dict:
+    """Shape a document written by this API like ``model`` without validating it.
+
+    Documents in our collections were validated on the way in, so building a
+    Pydantic model per document on the way out only costs time.
+    """
+    return {**model_defaults(model), **parse_from_mongo(doc)}
+
+def json_response(content, response: Optional[Response] = None,
+                  request: Optional[Request] = None) -> Response:
+    """Serialize with orjson, bypassing response_model validation.
+
+    Headers set on the injected ``response`` (pagination) are kept. With
+    ``request``, the body gets a content-hash ETag and a matching
+    If-None-Match is answered with 304 Not Modified.
+    """
+    result = ORJSONResponse(content)
+    if request is not None:
+        etag = '"' + hashlib.sha1(result.body).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        result.headers.update(headers)
+    if response is not None:
+        for key, value in response.headers.items():
+            if key != "content-length":
+                result.headers[key] = value
+    return result
+
+# Reference data cache
+REFERENCE_CACHE_TTL = 60  # seconds; bounds staleness across worker processes
+
+def compute_etag(data) -> str:
+    payload = json.dumps(jsonable_encoder(data), sort_keys=True, separators=(',', ':'))
+    return '"' + hashlib.sha1(payload.encode()).hexdigest() + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+class ReferenceCache:
+    """In-memory copy of a small, rarely changed collection.
+
+    Writes call invalidate(); a load that started before an invalidation is
+    never stored, so concurrent requests cannot resurrect stale data.
+    """
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = asyncio.Lock()
+        self._generation = 0
+        self._entry = None
+        self._loaded_at = 0.0
+
+    async def get(self):
+        """Return (items, etag), loading from the database when needed"""
+        if self._entry is not None and time.monotonic() - self._loaded_at < REFERENCE_CACHE_TTL:
+            return self._entry
+        async with self._lock:
+            if self._entry is not None and time.monotonic() - self._loaded_at < REFERENCE_CACHE_TTL:
+                return self._entry
+            generation = self._generation
+            items = await self._loader()
+            entry = (items, compute_etag(items))
+            if generation == self._generation:
+                self._entry = entry
+                self._loaded_at = time.monotonic()
+            return entry
+
+    def invalidate(self):
+        self._generation += 1
+        self._entry = None
+
+async def cached_reference_response(cache: ReferenceCache, request: Request, response: Response):
+    items, etag = await cache.get()
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return items
+
+# Geo helpers
+EARTH_RADIUS_KM = 6371.0
+MAX_NEAR_RADIUS = 100_000  # meters
+CLUSTER_CELL_PIXELS = 64  # clusters cover roughly this many screen pixels
+MAP_TILE_PIXELS = 256
+MAX_MAP_LATITUDE = 85.0511  # Web Mercator edge; polygon vertices at the poles degenerate
+
+def geo_point(latitude: Optional[float], longitude: Optional[float]):
+    """GeoJSON point stored in rental_notes.location (2dsphere indexed)"""
+    if latitude is None or longitude is None:
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+def parse_coordinates(value: str, count: int, name: str) -> List[float]:
+    try:
+        numbers = [float(part) for part in value.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count or not all(np.isfinite(numbers)):
+        raise HTTPException(status_code=400, detail=f"Parâmetro {name} inválido")
+    return numbers
+
+def wrap_longitude(longitude: float) -> float:
+    return (longitude + 180) % 360 - 180 if not -180 <= longitude <= 180 else longitude
+
+def map_data_query(bbox: Optional[str] = None, near: Optional[str] = None, radius: float = 5000,
+                   sort_by_distance: bool = True):
+    """Query for rental notes with coordinates, optionally limited to a viewport.
+
+    ``bbox`` is "west,south,east,north" (Leaflet's toBBoxString order) and
+    ``near`` is "lat,lng" with ``radius`` in meters; results of ``near`` are
+    ordered by distance unless ``sort_by_distance`` is False, which is
+    required inside aggregation pipelines.
+    """
+    if bbox:
+        west, south, east, north = parse_coordinates(bbox, 4, "bbox")
+        # Zoomed far out, Leaflet reports longitudes past ±180 and latitudes
+        # past the poles; a $geometry polygon must fit in one hemisphere
+        south, north = max(south, -MAX_MAP_LATITUDE), min(north, MAX_MAP_LATITUDE)
+        if west >= east or south >= north:
+            raise HTTPException(status_code=400, detail="Parâmetro bbox inválido")
+        if east - west >= 180:
+            return {"latitude": {"$ne": None}, "longitude": {"$ne": None}}
+        west, east = wrap_longitude(west), wrap_longitude(east)
+        return {"location": {"$geoWithin": {"$geometry": {
+            "type": "Polygon",
+            "coordinates": [[[west, south], [east, south], [east, north], [west, north], [west, south]]]
+        }}}}
+    if near:
+        latitude, longitude = parse_coordinates(near, 2, "near")
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            raise HTTPException(status_code=400, detail="Parâmetro near inválido")
+        if not sort_by_distance:
+            return {"location": {"$geoWithin": {
+                "$centerSphere": [[longitude, latitude], radius / (EARTH_RADIUS_KM * 1000)]
+            }}}
+        return {"location": {"$nearSphere": {
+            "$geometry": geo_point(latitude, longitude),
+            "$maxDistance": radius
+        }}}
+    return {"latitude": {"$ne": None}, "longitude": {"$ne": None}}
+
+# Rental age thresholds (in whole days since rental_date)
+EXPIRED_AFTER_DAYS = 7
+OVERDUE_AFTER_DAYS = 30
+
+def rental_age_cutoffs(now: Optional[datetime] = None):
+    """Return (expired_cutoff, overdue_cutoff) rental_date bounds.
+
+    An active note is yellow when rental_date <= expired_cutoff and purple when
+    rental_date <= overdue_cutoff, matching calculate_rental_status_color.
+    """
+    now = now or datetime.now(timezone.utc)
+    return (
+        now - timedelta(days=EXPIRED_AFTER_DAYS + 1),
+        now - timedelta(days=OVERDUE_AFTER_DAYS + 1)
+    )
+
+def with_color_status(note: dict) -> dict:
+    """Add color_status to a raw rental note document"""
+    note = parse_from_mongo(note)
+    note["color_status"] = calculate_rental_status_color(note["rental_date"], note.get("status"))
+    return note
+
 def calculate_rental_status_color(rental_date: datetime, status: str):
     """Calculate the color status based on rental date and current status"""
     if status == "retrieved":
@@ -223,9 +598,9 @@ def calculate_rental_status_color(rental_date: datetime, status: str):
     
     days_diff = (now - rental_date).days
     
-    if days_diff <= 7:
+    if days_diff <= EXPIRED_AFTER_DAYS:
         return "green"
-    elif days_diff <= 30:
+    elif days_diff <= OVERDUE_AFTER_DAYS:
         return "yellow"
     else:
         return "purple"
@@ -244,18 +619,417 @@ async def initialize_dumpster_types():
         for dt in default_types:
             dumpster_type = DumpsterType(**dt)
             await db.dumpster_types.insert_one(prepare_for_mongo(dumpster_type.dict()))
+        dumpster_types_cache.invalidate()
+
+# Delta sync
+SYNC_TOMBSTONE_DAYS = 30  # older watermarks get a full reload
+SYNC_OVERLAP = timedelta(seconds=5)  # covers writes from other workers committed late
+
+SYNC_MODELS = {
+    "clients": Client,
+    "dumpster_types": DumpsterType,
+    "rental_notes": RentalNote,
+    "payments": Payment,
+    "receivables": Receivable
+}
+
+async def record_tombstone(collection_name: str, doc_id: str):
+    """Remember a deleted document so /sync can report it"""
+    await db.tombstones.update_one(
+        {"id": doc_id},
+        {"$set": {"collection": collection_name, "updated_at": next_updated_at()}},
+        upsert=True
+    )
+
+@api_router.get("/sync")
+async def sync_changes(since: Optional[str] = None):
+    """Documents changed and ids deleted since a watermark.
+
+    Pass the returned ``watermark`` as ``since`` on the next call. Without
+    ``since``, or when it is older than the tombstones kept, everything is
+    returned with ``reset: true`` and local data should be replaced.
+    Changes near the watermark may be returned twice; apply them by id.
+    """
+    watermark = next_updated_at()
+    reset = since is None
+    if since is not None:
+        try:
+            since_date = parse_iso_datetime(since)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Marca de sincronização inválida")
+        reset = since_date < watermark - timedelta(days=SYNC_TOMBSTONE_DAYS)
+    
+    query = {} if reset else {"updated_at": {"$gt": since_date - SYNC_OVERLAP}}
+    results = await asyncio.gather(*[
+        db[name].find(query, model_projection(model)).to_list(length=None) for name, model in SYNC_MODELS.items()
+    ])
+    
+    deleted = {name: [] for name in SYNC_MODELS}
+    if not reset:
+        # A reset replaces local data, so deletions do not apply
+        tombstones = await db.tombstones.find(
+            {**query, "collection": {"$in": list(SYNC_MODELS)}},
+            {"_id": 0, "collection": 1, "id": 1}
+        ).to_list(length=None)
+        for tombstone in tombstones:
+            deleted[tombstone["collection"]].append(tombstone["id"])
+    
+    return json_response({
+        "watermark": watermark,
+        "reset": reset,
+        "changes": {
+            name: [from_trusted(doc, model) for doc in docs]
+            for (name, model), docs in zip(SYNC_MODELS.items(), results)
+        },
+        "deleted": deleted
+    })
+
+# Indexes for the query shapes used by the endpoints, per collection
+PAGE_INDEX = IndexModel([("created_at", ASCENDING), ("id", ASCENDING)])
+UPDATED_INDEX = IndexModel([("updated_at", ASCENDING)])
+
+INDEXES = {
+    "clients": [
+        PAGE_INDEX,
+        UPDATED_INDEX,
+        IndexModel([("search_terms", ASCENDING)]),
+        IndexModel([("name", TEXT), ("address", TEXT), ("cpf_cnpj", TEXT)],
+                   name="search_text", default_language="portuguese",
+                   weights={"name": 10, "cpf_cnpj": 10, "address": 3})
+    ],
+    "dumpster_types": [IndexModel([("size", ASCENDING)]), UPDATED_INDEX],
+    "rental_notes": [
+        PAGE_INDEX,
+        UPDATED_INDEX,
+        IndexModel([("search_terms", ASCENDING)]),
+        IndexModel([("client_name", TEXT), ("dumpster_code", TEXT), ("client_address", TEXT)],
+                   name="search_text", default_language="portuguese",
+                   weights={"client_name": 10, "dumpster_code": 10, "client_address": 3}),
+        IndexModel([("status", ASCENDING), ("rental_date", ASCENDING)]),
+        IndexModel([("rental_date", ASCENDING)]),
+        IndexModel([("client_id", ASCENDING)]),
+        IndexModel([("location", GEOSPHERE)])
+    ],
+    "payments": [PAGE_INDEX, UPDATED_INDEX, IndexModel([("due_date", ASCENDING)])],
+    "receivables": [
+        PAGE_INDEX,
+        UPDATED_INDEX,
+        IndexModel([("received_date", ASCENDING)]),
+        IndexModel([("rental_note_id", ASCENDING)], unique=True)
+    ],
+    "dumpsters": [
+        IndexModel([("code", ASCENDING)], unique=True),
+        IndexModel([("size", ASCENDING), ("status", ASCENDING)])
+    ],
+    "landfills": [IndexModel([("is_active", ASCENDING)])],
+    "routes": [IndexModel([("created_date", ASCENDING), ("id", ASCENDING)])],
+    "waypoints": [IndexModel([("route_id", ASCENDING), ("sequence", ASCENDING)])],
+    "tombstones": [IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=SYNC_TOMBSTONE_DAYS * 86400)],
+}
+
+async def ensure_collection_indexes(name: str, indexes: List[IndexModel]):
+    collection = db[name]
+    try:
+        await collection.create_indexes([IndexModel([("id", ASCENDING)], unique=True), *indexes])
+    except OperationFailure as e:
+        # Duplicate ids or a conflicting index definition must not keep the API down
+        logger.error(f"Could not create indexes on {name}: {e}")
+
+@app.on_event("startup")
+async def create_indexes():
+    # create_indexes is a no-op for indexes that already exist
+    await asyncio.gather(*[
+        ensure_collection_indexes(name, indexes) for name, indexes in INDEXES.items()
+    ])
+
+# Materialized rental counters
+STATS_GLOBAL = "global"
+STATS_ACTIVE_BY_DAY = "active_by_day"
+STATS_FIELDS = ("total", "paid", "active", "retrieved")
+
+def client_stats_key(client_id: str) -> str:
+    return f"client:{client_id}"
+
+def rental_stats_delta(note: dict, sign: int = 1) -> Dict[str, int]:
+    """Counter changes for adding (sign=1) or removing (sign=-1) a note"""
+    return {
+        "total": sign,
+        "paid": sign if note.get("is_paid") else 0,
+        "active": sign if note.get("status") == "active" else 0,
+        "retrieved": sign if note.get("status") == "retrieved" else 0
+    }
+
+def rental_day(rental_date) -> str:
+    """UTC day of a rental_date, the key of the active notes histogram"""
+    if isinstance(rental_date, str):
+        rental_date = parse_iso_datetime(rental_date)
+    if rental_date.tzinfo is None:
+        rental_date = rental_date.replace(tzinfo=timezone.utc)
+    return rental_date.astimezone(timezone.utc).strftime("%Y-%m-%d")
+
+def active_day_delta(note: dict, sign: int = 1) -> Dict[str, int]:
+    """Histogram change for adding (sign=1) or removing (sign=-1) a note"""
+    if note.get("status") != "active" or note.get("rental_date") is None:
+        return {}
+    return {rental_day(note["rental_date"]): sign}
+
+async def apply_stats(deltas: Dict[Optional[str], Dict[str, int]], days: Optional[Dict[str, int]] = None):
+    """$inc the global counters and those of each client in one bulk write.
+
+    ``deltas`` maps client_id (None for unregistered clients) to counter changes,
+    ``days`` maps rental days to changes in the number of active notes.
+    """
+    totals = defaultdict(int)
+    operations = []
+    for client_id, delta in deltas.items():
+        delta = {field: value for field, value in delta.items() if value}
+        for field, value in delta.items():
+            totals[field] += value
+        if client_id and delta:
+            operations.append(UpdateOne({"_id": client_stats_key(client_id)}, {"$inc": delta}, upsert=True))
+    totals = {field: value for field, value in totals.items() if value}
+    if totals:
+        operations.append(UpdateOne({"_id": STATS_GLOBAL}, {"$inc": totals}, upsert=True))
+    days = {f"days.{day}": value for day, value in (days or {}).items() if value}
+    if days:
+        operations.append(UpdateOne({"_id": STATS_ACTIVE_BY_DAY}, {"$inc": days}, upsert=True))
+    if operations:
+        await db.stats.bulk_write(operations, ordered=False)
+
+async def update_stats(client_id: Optional[str], days: Optional[Dict[str, int]] = None, **delta: int):
+    await apply_stats({client_id: delta}, days)
+
+async def read_stats(key: str) -> Dict[str, int]:
+    doc = await db.stats.find_one({"_id": key}) or {}
+    return {field: doc.get(field, 0) for field in STATS_FIELDS}
+
+async def rebuild_stats() -> int:
+    """Recompute every counter from rental_notes; returns the number of clients"""
+    groups = await db.rental_notes.aggregate([
+        {"$group": {
+            "_id": "$client_id",
+            "total": {"$sum": 1},
+            "paid": {"$sum": {"$cond": [{"$eq": ["$is_paid", True]}, 1, 0]}},
+            "active": {"$sum": {"$cond": [{"$eq": ["$status", "active"]}, 1, 0]}},
+            "retrieved": {"$sum": {"$cond": [{"$eq": ["$status", "retrieved"]}, 1, 0]}}
+        }}
+    ], allowDiskUse=True).to_list(length=None)
+    
+    totals = {field: 0 for field in STATS_FIELDS}
+    counters = {}
+    for group in groups:
+        for field in STATS_FIELDS:
+            totals[field] += group[field]
+        if group["_id"]:
+            counters[client_stats_key(group["_id"])] = {field: group[field] for field in STATS_FIELDS}
+    counters[STATS_GLOBAL] = totals
+    
+    days = await db.rental_notes.aggregate([
+        {"$match": {"status": "active", "rental_date": {"$type": "date"}}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$rental_date"}},
+            "count": {"$sum": 1}
+        }}
+    ], allowDiskUse=True).to_list(length=None)
+    counters[STATS_ACTIVE_BY_DAY] = {"days": {day["_id"]: day["count"] for day in days}, "overdue": 0}
+    
+    await db.stats.bulk_write([
+        ReplaceOne({"_id": key}, values, upsert=True) for key, values in counters.items()
+    ], ordered=False)
+    # Clients whose notes were all deleted keep no counters
+    await db.stats.delete_many({"_id": {"$nin": list(counters)}})
+    await roll_active_days()
+    return len(counters) - 2
+
+async def roll_active_days(now: Optional[datetime] = None):
+    """Fold histogram days that can only be overdue into a single counter.
+
+    Age only grows, so a day before the overdue cutoff stays overdue until its
+    notes are retrieved; the histogram keeps about OVERDUE_AFTER_DAYS keys.
+    Both updates are single-document and safe to run from several workers.
+    """
+    _, overdue_cutoff = rental_age_cutoffs(now)
+    boundary = rental_day(overdue_cutoff)
+    histogram = await db.stats.find_one({"_id": STATS_ACTIVE_BY_DAY}, {"days": 1})
+    old_days = {day: count for day, count in ((histogram or {}).get("days") or {}).items() if day < boundary}
+    if not old_days:
+        return
+    await db.stats.update_one({"_id": STATS_ACTIVE_BY_DAY}, {"$inc": {
+        "overdue": sum(old_days.values()),
+        **{f"days.{day}": -count for day, count in old_days.items()}
+    }})
+    # Drop the keys that are now zero, unless a write moved them meanwhile
+    await db.stats.update_one({"_id": STATS_ACTIVE_BY_DAY}, [{"$set": {"days": {"$arrayToObject": {
+        "$filter": {"input": {"$objectToArray": "$days"}, "cond": {"$ne": ["$$this.v", 0]}}
+    }}}}])
+
+async def count_active_by_age(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Count active notes per color from the histogram.
+
+    Whole days on either side of a cutoff are summed from their buckets; only
+    the two days a cutoff falls into are counted exactly in rental_notes.
+    """
+    now = now or datetime.now(timezone.utc)
+    expired_cutoff, overdue_cutoff = rental_age_cutoffs(now)
+    expired_day, overdue_day = rental_day(expired_cutoff), rental_day(overdue_cutoff)
+    histogram = await db.stats.find_one({"_id": STATS_ACTIVE_BY_DAY}) or {}
+    days = histogram.get("days") or {}
+    
+    counts = {"green": 0, "yellow": 0, "purple": histogram.get("overdue", 0)}
+    for day, count in days.items():
+        if day < overdue_day:
+            counts["purple"] += count
+        elif overdue_day < day < expired_day:
+            counts["yellow"] += count
+        elif day > expired_day:
+            counts["green"] += count
+    
+    async def split(day: str, cutoff: datetime, older: str, newer: str):
+        total = days.get(day, 0)
+        if not total:
+            return
+        day_start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        before = await db.rental_notes.count_documents({
+            "status": "active",
+            "rental_date": {"$gte": day_start, "$lte": cutoff}
+        })
+        counts[older] += before
+        counts[newer] += total - before
+    
+    await asyncio.gather(
+        split(overdue_day, overdue_cutoff, "purple", "yellow"),
+        split(expired_day, expired_cutoff, "yellow", "green")
+    )
+    return counts
+
+async def roll_active_days_daily():
+    """Roll the histogram forward shortly after every UTC midnight"""
+    while True:
+        now = datetime.now(timezone.utc)
+        midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=1, microsecond=0)
+        await asyncio.sleep((midnight - now).total_seconds())
+        try:
+            await roll_active_days()
+        except Exception:
+            logger.exception("Rolling the active rentals histogram failed")
+
+active_days_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def initialize_stats():
+    global active_days_task
+    missing = await db.stats.count_documents({"_id": {"$in": [STATS_GLOBAL, STATS_ACTIVE_BY_DAY]}}) < 2
+    if missing:
+        clients = await rebuild_stats()
+        logger.info(f"Rental counters rebuilt for {clients} clients")
+    else:
+        await roll_active_days()
+    active_days_task = asyncio.create_task(roll_active_days_daily())
+
+@app.on_event("shutdown")
+async def stop_active_days_task():
+    if active_days_task is not None:
+        active_days_task.cancel()
+
+# Search
+SEARCH_MAX_TOKENS = 5
+SEARCH_MAX_RESULTS = 50
+SEARCH_PREFIX_SCORE = 2.0  # a prefix match on every token outranks most text matches
+
+def search_tokens(text: Optional[str]) -> List[str]:
+    """Lowercase, accent-free words: "Média" -> ["media"]"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return re.findall(r"[a-z0-9]+", text)
+
+def search_terms(words: List[Optional[str]], compact: List[Optional[str]] = ()) -> List[str]:
+    """Terms for the prefix index: every word of ``words``, plus each value of
+    ``compact`` without separators so "CX-012" and "123.456.789-00" match as typed
+    without punctuation."""
+    terms = set()
+    for value in words:
+        terms.update(search_tokens(value))
+    for value in compact:
+        joined = "".join(search_tokens(value))
+        if joined:
+            terms.add(joined)
+    return sorted(terms)
+
+def client_document(client: Client) -> dict:
+    client_doc = prepare_for_mongo(client.dict())
+    client_doc["search_terms"] = search_terms(
+        [client.name, client.address, client.cpf_cnpj, client.phone],
+        [client.cpf_cnpj, client.phone]
+    )
+    return client_doc
+
+def rental_note_search_terms(note: dict) -> List[str]:
+    return search_terms(
+        [note.get("client_name"), note.get("client_address"), note.get("dumpster_code")],
+        [note.get("dumpster_code")]
+    )
+
+async def search_collection(collection, model, q: str, tokens: List[str], limit: int) -> List[dict]:
+    """Rank documents by text score plus a bonus when every token prefixes a term"""
+    projection = model_projection(model)
+    prefix_query = {"$and": [{"search_terms": re.compile("^" + re.escape(token))} for token in tokens]}
+    text_docs, prefix_docs = await asyncio.gather(
+        collection.find({"$text": {"$search": q}}, {**projection, "score": {"$meta": "textScore"}})
+            .sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(length=None),
+        collection.find(prefix_query, {**projection, "search_terms": 1}).limit(limit).to_list(length=None)
+    )
+    
+    ranked = {}
+    for doc in text_docs:
+        ranked[doc["id"]] = [doc.pop("score"), doc]
+    for doc in prefix_docs:
+        # Whole-word matches rank above partial ones
+        exact = len(set(tokens) & set(doc.pop("search_terms")))
+        entry = ranked.setdefault(doc["id"], [0.0, doc])
+        entry[0] += SEARCH_PREFIX_SCORE + exact / len(tokens)
+    
+    results = sorted(ranked.values(), key=lambda entry: entry[0], reverse=True)[:limit]
+    return [{**from_trusted(doc, model), "score": round(score, 3)} for score, doc in results]
+
+@api_router.get("/search")
+async def search(q: str = Query(..., min_length=1, max_length=100),
+                 limit: int = Query(10, ge=1, le=SEARCH_MAX_RESULTS)):
+    """Clients and rental notes matching ``q``, best matches first.
+
+    Words are matched as prefixes, ignoring case and accents, over client
+    name/address/CPF-CNPJ/phone and note client name/address/dumpster code;
+    the text index adds Portuguese stemming.
+    """
+    tokens = search_tokens(q)[:SEARCH_MAX_TOKENS]
+    if not tokens:
+        return json_response({"clients": [], "rental_notes": []})
+    clients, rental_notes = await asyncio.gather(
+        search_collection(db.clients, Client, q, tokens, limit),
+        search_collection(db.rental_notes, RentalNote, q, tokens, limit)
+    )
+    return json_response({
+        "clients": clients,
+        "rental_notes": [with_color_status(note) for note in rental_notes]
+    })
 
 # Client endpoints
 @api_router.post("/clients", response_model=Client)
 async def create_client(client_data: ClientCreate):
     client = Client(**client_data.dict())
-    await db.clients.insert_one(prepare_for_mongo(client.dict()))
+    await db.clients.insert_one(client_document(client))
     return client
 
 @api_router.get("/clients", response_model=List[Client])
-async def get_clients():
-    clients = await db.clients.find().to_list(length=None)
-    return [Client(**parse_from_mongo(client)) for client in clients]
+async def get_clients(request: Request,
+                      response: Response,
+                      limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                      after: Optional[str] = None,
+                      order: SortOrder = SortOrder.ASC):
+    if accepts_ndjson(request):
+        return ndjson_response(page_cursor(db.clients, {}, limit, after, order,
+                                           projection=model_projection(Client)))
+    clients = await find_page(db.clients, {}, response, limit, after, order,
+                              projection=model_projection(Client))
+    return json_response([from_trusted(client, Client) for client in clients], response, request)
 
 @api_router.get("/clients/{client_id}", response_model=Client)
 async def get_client(client_id: str):
@@ -267,199 +1041,421 @@ async def get_client(client_id: str):
 @api_router.put("/clients/{client_id}", response_model=Client)
 async def update_client(client_id: str, client_data: ClientUpdate):
     update_data = {k: v for k, v in client_data.dict().items() if v is not None}
-    result = await db.clients.update_one({"id": client_id}, {"$set": update_data})
-    if result.matched_count == 0:
+    update_data["updated_at"] = next_updated_at()
+    updated_client = await db.clients.find_one_and_update(
+        {"id": client_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated_client is None:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
-    updated_client = await db.clients.find_one({"id": client_id})
-    return Client(**parse_from_mongo(updated_client))
+    client = Client(**parse_from_mongo(updated_client))
+    terms = client_document(client)["search_terms"]
+    if terms != updated_client.get("search_terms"):
+        await db.clients.update_one({"id": client_id}, {"$set": {"search_terms": terms}})
+    return client
 
 @api_router.delete("/clients/{client_id}")
 async def delete_client(client_id: str):
     result = await db.clients.delete_one({"id": client_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    await record_tombstone("clients", client_id)
     return {"message": "Cliente excluído com sucesso"}
 
 @api_router.get("/clients/{client_id}/stats")
 async def get_client_stats(client_id: str):
-    # Get client rentals
-    rentals = await db.rental_notes.find({"client_id": client_id}).to_list(length=None)
-    
-    total_rentals = len(rentals)
-    paid_rentals = len([r for r in rentals if r.get('is_paid', False)])
-    open_rentals = total_rentals - paid_rentals
+    stats = await read_stats(client_stats_key(client_id))
     
     return {
-        "total_dumpsters": total_rentals,
-        "paid_dumpsters": paid_rentals,
-        "open_dumpsters": open_rentals
+        "total_dumpsters": stats["total"],
+        "paid_dumpsters": stats["paid"],
+        "open_dumpsters": stats["total"] - stats["paid"]
     }
 
 # Dumpster types endpoints
-@api_router.get("/dumpster-types", response_model=List[DumpsterType])
-async def get_dumpster_types():
-    types = await db.dumpster_types.find().to_list(length=None)
+async def load_dumpster_types():
+    types = await db.dumpster_types.find({}, {"_id": 0}).to_list(length=None)
     return [DumpsterType(**parse_from_mongo(dt)) for dt in types]
 
+dumpster_types_cache = ReferenceCache(load_dumpster_types)
+
+@api_router.get("/dumpster-types", response_model=List[DumpsterType])
+async def get_dumpster_types(request: Request, response: Response):
+    return await cached_reference_response(dumpster_types_cache, request, response)
+
 @api_router.put("/dumpster-types/{size}")
 async def update_dumpster_price(size: str, price_data: DumpsterTypeUpdate):
     result = await db.dumpster_types.update_one(
         {"size": size},
-        {"$set": {"price": price_data.price}}
+        {"$set": {"price": price_data.price, "updated_at": next_updated_at()}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Tipo de caçamba não encontrado")
+    dumpster_types_cache.invalidate()
     return {"message": "Preço atualizado com sucesso"}
 
+# Dumpster inventory
+DUMPSTER_REBUILD_BATCH = 500
+
+def dumpster_code_key(code: str) -> str:
+    """Codes are compared trimmed and uppercase: " d-042" books D-042"""
+    return code.strip().upper()
+
+def dumpster_already_rented(code: str) -> str:
+    return f"Caçamba {dumpster_code_key(code)} já está locada"
+
+def dumpster_claim(note_doc: dict):
+    """(filter, update) marking the dumpster of a new note as rented, creating it if unknown.
+
+    Only an available (or new) dumpster matches; for one already out the
+    upsert collides with the unique code index, which rejects the booking.
+    """
+    key = dumpster_code_key(note_doc["dumpster_code"])
+    now = next_updated_at()
+    claimed = {
+        "status": DumpsterStatus.RENTED.value,
+        "current_rental_id": note_doc["id"],
+        "size": note_doc.get("dumpster_size"),
+        "updated_at": now
+    }
+    if note_doc.get("latitude") is not None and note_doc.get("longitude") is not None:
+        claimed["latitude"] = note_doc["latitude"]
+        claimed["longitude"] = note_doc["longitude"]
+    new_dumpster = Dumpster(code=key)
+    return (
+        {"code": key, "status": {"$ne": DumpsterStatus.RENTED.value}},
+        {"$set": claimed, "$setOnInsert": {"id": new_dumpster.id, "created_at": new_dumpster.created_at}}
+    )
+
+async def claim_dumpster(note_doc: dict):
+    try:
+        await db.dumpsters.update_one(*dumpster_claim(note_doc), upsert=True)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=dumpster_already_rented(note_doc["dumpster_code"]))
+
+async def release_dumpster(code: Optional[str], note_id: str):
+    """Make the dumpster available again if ``note_id`` is still its current rental"""
+    if not code:
+        return
+    await db.dumpsters.update_one(
+        {"code": dumpster_code_key(code), "current_rental_id": note_id},
+        {"$set": {
+            "status": DumpsterStatus.AVAILABLE.value,
+            "current_rental_id": None,
+            "updated_at": next_updated_at()
+        }}
+    )
+
+async def rebuild_dumpsters(codes: Optional[Iterable[str]] = None) -> int:
+    """Recompute the inventory from rental_notes; returns the number of dumpsters.
+
+    With ``codes``, only those dumpsters are recomputed. Dumpsters registered
+    without rentals are kept. When old data has several active notes for one
+    code, the most recent one is taken as current.
+    """
+    query = {"dumpster_code": {"$nin": [None, ""]}}
+    if codes is not None:
+        codes = set(codes)
+        query["dumpster_code"] = {"$in": list(codes | {dumpster_code_key(code) for code in codes})}
+    
+    # The latest active note of each code, or its latest note when none is active
+    notes = db.rental_notes.aggregate([
+        {"$match": query},
+        {"$project": {
+            "_id": 0, "id": 1, "dumpster_size": 1, "status": 1, "latitude": 1, "longitude": 1, "created_at": 1,
+            "key": {"$toUpper": {"$trim": {"input": "$dumpster_code"}}},
+            "active": {"$eq": ["$status", "active"]}
+        }},
+        {"$sort": {"key": 1, "active": -1, "created_at": -1}},
+        {"$group": {"_id": "$key", "note": {"$first": "$$ROOT"}}}
+    ], allowDiskUse=True)
+    
+    count = 0
+    operations = []
+    async for group in notes:
+        key, note = group["_id"], group["note"]
+        if not key:
+            continue
+        rented = note["active"]
+        new_dumpster = Dumpster(code=key)
+        operations.append(UpdateOne({"code": key}, {
+            "$set": {
+                "size": note.get("dumpster_size"),
+                "status": (DumpsterStatus.RENTED if rented else DumpsterStatus.AVAILABLE).value,
+                "current_rental_id": note["id"] if rented else None,
+                "latitude": note.get("latitude"),
+                "longitude": note.get("longitude"),
+                "updated_at": next_updated_at()
+            },
+            "$setOnInsert": {"id": new_dumpster.id, "created_at": new_dumpster.created_at}
+        }, upsert=True))
+        if len(operations) >= DUMPSTER_REBUILD_BATCH:
+            await db.dumpsters.bulk_write(operations, ordered=False)
+            count += len(operations)
+            operations = []
+    if operations:
+        await db.dumpsters.bulk_write(operations, ordered=False)
+        count += len(operations)
+    return count
+
+@app.on_event("startup")
+async def initialize_dumpsters():
+    if await db.dumpsters.estimated_document_count() == 0:
+        count = await rebuild_dumpsters()
+        if count:
+            logger.info(f"Dumpster inventory rebuilt with {count} dumpsters")
+
+@api_router.post("/dumpsters", response_model=Dumpster)
+async def create_dumpster(dumpster_data: DumpsterCreate):
+    """Register a dumpster of the fleet before its first rental"""
+    dumpster = Dumpster(code=dumpster_code_key(dumpster_data.code), size=dumpster_data.size)
+    if not dumpster.code:
+        raise HTTPException(status_code=400, detail="Código da caçamba é obrigatório")
+    try:
+        await db.dumpsters.insert_one(prepare_for_mongo(dumpster.dict()))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Caçamba já cadastrada")
+    return dumpster
+
+@api_router.get("/dumpsters", response_model=List[Dumpster])
+async def get_dumpsters(request: Request,
+                        status: Optional[DumpsterStatus] = None,
+                        size: Optional[DumpsterSize] = None):
+    query = {}
+    if status:
+        query["status"] = status.value
+    if size:
+        query["size"] = size.value
+    dumpsters = await db.dumpsters.find(query, model_projection(Dumpster)).sort("code", 1).to_list(length=None)
+    return json_response([from_trusted(dumpster, Dumpster) for dumpster in dumpsters], request=request)
+
+@api_router.get("/dumpsters/availability")
+async def get_dumpster_availability():
+    """Available and rented dumpsters per size"""
+    groups = await db.dumpsters.aggregate([
+        {"$group": {"_id": {"size": "$size", "status": "$status"}, "count": {"$sum": 1}}}
+    ]).to_list(length=None)
+    
+    availability = {}
+    for group in groups:
+        size = group["_id"].get("size") or "unknown"
+        counts = availability.setdefault(size, {status.value: 0 for status in DumpsterStatus})
+        counts[group["_id"]["status"]] = group["count"]
+    return availability
+
+@api_router.get("/dumpsters/{code}", response_model=Dumpster)
+async def get_dumpster(code: str):
+    dumpster = await db.dumpsters.find_one({"code": dumpster_code_key(code)}, model_projection(Dumpster))
+    if dumpster is None:
+        raise HTTPException(status_code=404, detail="Caçamba não encontrada")
+    return json_response(from_trusted(dumpster, Dumpster))
+
 # Rental notes endpoints
-@api_router.post("/rental-notes", response_model=RentalNote)
-async def create_rental_note(rental_data: RentalNoteCreate):
+UNREGISTERED_CLIENT_REQUIRED = "Nome e endereço são obrigatórios para clientes não cadastrados"
+
+def build_rental_note(rental_data: RentalNoteCreate, client: Optional[dict]) -> RentalNote:
+    """Fill the client fields of a new note from the registered client, if any"""
     rental_dict = rental_data.dict()
     
     # Handle registered client
-    if rental_data.client_id:
-        client = await db.clients.find_one({"id": rental_data.client_id})
-        if not client:
-            raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    if client:
         rental_dict["client_name"] = client["name"]
         rental_dict["client_address"] = client["address"]
         rental_dict["client_phone"] = client.get("phone", "")
     # Handle unregistered client
     else:
-        if not rental_data.client_name or not rental_data.client_address:
-            raise HTTPException(status_code=400, detail="Nome e endereço são obrigatórios para clientes não cadastrados")
         rental_dict["client_name"] = rental_data.client_name
         rental_dict["client_address"] = rental_data.client_address
         rental_dict["client_phone"] = rental_data.client_phone or ""
     
-    rental_note = RentalNote(**rental_dict)
-    await db.rental_notes.insert_one(prepare_for_mongo(rental_note.dict()))
+    return RentalNote(**rental_dict)
+
+def rental_note_document(rental_note: RentalNote) -> dict:
+    note_doc = prepare_for_mongo(rental_note.dict())
+    location = geo_point(rental_note.latitude, rental_note.longitude)
+    if location:
+        note_doc["location"] = location
+    note_doc["search_terms"] = rental_note_search_terms(note_doc)
+    return note_doc
+
+@api_router.post("/rental-notes", response_model=RentalNote)
+async def create_rental_note(rental_data: RentalNoteCreate):
+    client = None
+    if rental_data.client_id:
+        client = await db.clients.find_one({"id": rental_data.client_id})
+        if not client:
+            raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    elif not rental_data.client_name or not rental_data.client_address:
+        raise HTTPException(status_code=400, detail=UNREGISTERED_CLIENT_REQUIRED)
+    
+    rental_note = build_rental_note(rental_data, client)
+    note_doc = rental_note_document(rental_note)
+    await claim_dumpster(note_doc)
+    try:
+        await db.rental_notes.insert_one(note_doc)
+    except Exception:
+        await release_dumpster(rental_note.dumpster_code, rental_note.id)
+        raise
+    await update_stats(rental_note.client_id, active_day_delta(note_doc), **rental_stats_delta(note_doc))
     return rental_note
 
 @api_router.get("/rental-notes", response_model=List[RentalNote])
-async def get_rental_notes():
-    notes = await db.rental_notes.find().to_list(length=None)
-    result = []
-    for note in notes:
-        parsed_note = parse_from_mongo(note)
-        rental_note = RentalNote(**parsed_note)
-        result.append(rental_note)
-    return result
+async def get_rental_notes(request: Request,
+                           response: Response,
+                           limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                           after: Optional[str] = None,
+                           order: SortOrder = SortOrder.ASC):
+    if accepts_ndjson(request):
+        return ndjson_response(page_cursor(db.rental_notes, {}, limit, after, order,
+                                           projection=model_projection(RentalNote)))
+    notes = await find_page(db.rental_notes, {}, response, limit, after, order,
+                            projection=model_projection(RentalNote))
+    return json_response([from_trusted(note, RentalNote) for note in notes], response, request)
 
 @api_router.delete("/rental-notes/{note_id}")
 async def delete_rental_note(note_id: str):
-    result = await db.rental_notes.delete_one({"id": note_id})
-    if result.deleted_count == 0:
+    note = await db.rental_notes.find_one_and_delete(
+        {"id": note_id},
+        projection={"_id": 0, "client_id": 1, "is_paid": 1, "status": 1, "rental_date": 1, "dumpster_code": 1}
+    )
+    if note is None:
         raise HTTPException(status_code=404, detail="Nota não encontrada")
+    await asyncio.gather(
+        update_stats(note.get("client_id"), active_day_delta(note, -1), **rental_stats_delta(note, -1)),
+        record_tombstone("rental_notes", note_id),
+        release_dumpster(note.get("dumpster_code"), note_id)
+    )
     return {"message": "Nota excluída com sucesso"}
 
 @api_router.get("/rental-notes/active")
-async def get_active_rental_notes():
-    notes = await db.rental_notes.find({"status": "active"}).to_list(length=None)
+async def get_active_rental_notes(request: Request,
+                                  response: Response,
+                                  limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                                  after: Optional[str] = None,
+                                  order: SortOrder = SortOrder.ASC):
+    notes = await find_page(db.rental_notes, {"status": "active"}, response, limit, after, order,
+                            projection=model_projection(RentalNote))
     result = []
     
     for note in notes:
-        parsed_note = parse_from_mongo(note)
-        rental_note = RentalNote(**parsed_note)
-        
-        # Calculate color status
-        color_status = calculate_rental_status_color(
-            rental_note.rental_date, 
-            rental_note.status
+        note_with_status = from_trusted(note, RentalNote)
+        note_with_status["color_status"] = calculate_rental_status_color(
+            note_with_status["rental_date"],
+            note_with_status["status"]
         )
-        
-        note_with_status = rental_note.dict()
-        note_with_status["color_status"] = color_status
         result.append(note_with_status)
     
-    return result
+    return json_response(result, response, request)
 
 @api_router.get("/rental-notes/retrieved")
-async def get_retrieved_rental_notes():
-    notes = await db.rental_notes.find({"status": "retrieved"}).to_list(length=None)
+async def get_retrieved_rental_notes(request: Request,
+                                     response: Response,
+                                     limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                                     after: Optional[str] = None,
+                                     order: SortOrder = SortOrder.ASC):
+    notes = await find_page(db.rental_notes, {"status": "retrieved"}, response, limit, after, order,
+                            projection=model_projection(RentalNote))
     result = []
     
     for note in notes:
-        parsed_note = parse_from_mongo(note)
-        rental_note = RentalNote(**parsed_note)
-        
-        note_with_status = rental_note.dict()
+        note_with_status = from_trusted(note, RentalNote)
         note_with_status["color_status"] = "red"
         result.append(note_with_status)
     
-    return result
+    return json_response(result, response, request)
 
 @api_router.get("/rental-notes/overdue")
-async def get_overdue_rental_notes():
+async def get_overdue_rental_notes(request: Request,
+                                   response: Response,
+                                   limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                                   after: Optional[str] = None,
+                                   order: SortOrder = SortOrder.ASC):
     """Get rentals that are overdue (30+ days)"""
-    notes = await db.rental_notes.find({"status": "active"}).to_list(length=None)
+    _, overdue_cutoff = rental_age_cutoffs()
+    query = {
+        "status": "active",
+        "rental_date": {"$lte": overdue_cutoff}
+    }
+    notes = await find_page(db.rental_notes, query, response, limit, after, order,
+                            projection=model_projection(RentalNote))
     result = []
     
     for note in notes:
-        parsed_note = parse_from_mongo(note)
-        rental_note = RentalNote(**parsed_note)
-        
-        # Calculate color status
-        color_status = calculate_rental_status_color(
-            rental_note.rental_date, 
-            rental_note.status
-        )
-        
-        # Only include purple (30+ days) rentals
-        if color_status == "purple":
-            note_with_status = rental_note.dict()
-            note_with_status["color_status"] = color_status
-            result.append(note_with_status)
+        note_with_status = from_trusted(note, RentalNote)
+        note_with_status["color_status"] = "purple"
+        result.append(note_with_status)
     
-    return result
+    return json_response(result, response, request)
 
 @api_router.get("/rental-notes/expired")
-async def get_expired_rental_notes():
+async def get_expired_rental_notes(request: Request,
+                                   response: Response,
+                                   limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                                   after: Optional[str] = None,
+                                   order: SortOrder = SortOrder.ASC):
     """Get rentals that are expired (7-30 days) - yellow status"""
-    notes = await db.rental_notes.find({"status": "active"}).to_list(length=None)
+    expired_cutoff, overdue_cutoff = rental_age_cutoffs()
+    query = {
+        "status": "active",
+        "rental_date": {
+            "$gt": overdue_cutoff,
+            "$lte": expired_cutoff
+        }
+    }
+    notes = await find_page(db.rental_notes, query, response, limit, after, order,
+                            projection=model_projection(RentalNote))
     result = []
     
     for note in notes:
-        parsed_note = parse_from_mongo(note)
-        rental_note = RentalNote(**parsed_note)
-        
-        # Calculate color status
-        color_status = calculate_rental_status_color(
-            rental_note.rental_date, 
-            rental_note.status
-        )
-        
-        # Only include yellow (7-30 days) rentals
-        if color_status == "yellow":
-            note_with_status = rental_note.dict()
-            note_with_status["color_status"] = color_status
-            result.append(note_with_status)
+        note_with_status = from_trusted(note, RentalNote)
+        note_with_status["color_status"] = "yellow"
+        result.append(note_with_status)
     
-    return result
+    return json_response(result, response, request)
 
 @api_router.put("/rental-notes/{note_id}/retrieve")
 async def mark_as_retrieved(note_id: str):
-    result = await db.rental_notes.update_one(
-        {"id": note_id},
-        {"$set": {"status": "retrieved"}}
+    note = await db.rental_notes.find_one_and_update(
+        {"id": note_id, "status": {"$ne": "retrieved"}},
+        {"$set": {"status": "retrieved", "updated_at": next_updated_at()}},
+        projection={"_id": 0, "client_id": 1, "status": 1, "rental_date": 1, "dumpster_code": 1}
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Nota não encontrada")
+    if note is None:
+        if await db.rental_notes.count_documents({"id": note_id}, limit=1) == 0:
+            raise HTTPException(status_code=404, detail="Nota não encontrada")
+    else:
+        await asyncio.gather(
+            update_stats(note.get("client_id"), active_day_delta(note, -1),
+                         active=-1 if note.get("status") == "active" else 0,
+                         retrieved=1),
+            release_dumpster(note.get("dumpster_code"), note_id)
+        )
     return {"message": "Caçamba marcada como retirada"}
 
 @api_router.put("/rental-notes/{note_id}/pay")
 async def mark_as_paid(note_id: str):
-    # Get the rental note
-    rental = await db.rental_notes.find_one({"id": note_id})
-    if not rental:
-        raise HTTPException(status_code=404, detail="Nota não encontrada")
-    
-    # Mark as paid
-    await db.rental_notes.update_one(
-        {"id": note_id},
-        {"$set": {"is_paid": True}}
+    """Mark a rental note as paid and record its receivable.
+
+    Safe to repeat: only the request that flips is_paid counts as the payment,
+    and the receivable is keyed by rental_note_id, so concurrent or retried
+    requests never record it twice.
+    """
+    projection = {"_id": 0, "client_id": 1, "client_name": 1, "dumpster_code": 1, "price": 1}
+    rental = await db.rental_notes.find_one_and_update(
+        {"id": note_id, "is_paid": {"$ne": True}},
+        {"$set": {"is_paid": True, "updated_at": next_updated_at()}},
+        projection=projection
     )
+    if rental is None:
+        # Already paid (or missing); still make sure the receivable exists
+        rental = await db.rental_notes.find_one({"id": note_id}, projection)
+        if rental is None:
+            raise HTTPException(status_code=404, detail="Nota não encontrada")
+    else:
+        await update_stats(rental.get("client_id"), paid=1)
     
     # Create automatic receivable record
     receivable_data = {
@@ -471,133 +1467,251 @@ async def mark_as_paid(note_id: str):
         "received_date": datetime.now(timezone.utc)
     }
     
-    receivable = Receivable(**receivable_data)
-    await db.receivables.insert_one(prepare_for_mongo(receivable.dict()))
+    receivable = prepare_for_mongo(Receivable(**receivable_data).dict())
+    del receivable["rental_note_id"]
+    try:
+        await db.receivables.update_one(
+            {"rental_note_id": note_id},
+            {"$setOnInsert": receivable},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass  # a concurrent request inserted it first
     
     return {"message": "Caçamba marcada como paga e recebimento registrado"}
 
 @api_router.put("/rental-notes/{note_id}/coordinates")
-async def update_rental_coordinates(note_id: str, latitude: float, longitude: float):
+async def update_rental_coordinates(note_id: str,
+                                    latitude: float = Query(..., ge=-90, le=90),
+                                    longitude: float = Query(..., allow_inf_nan=False)):
     """Update coordinates for a rental note"""
-    result = await db.rental_notes.update_one(
+    # Clicks on a wrapped copy of the world report longitudes past ±180
+    longitude = wrap_longitude(longitude)
+    rental = await db.rental_notes.find_one_and_update(
         {"id": note_id},
-        {"$set": {"latitude": latitude, "longitude": longitude}}
+        {"$set": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "location": geo_point(latitude, longitude),
+            "updated_at": next_updated_at()
+        }},
+        projection={"_id": 0, "client_address": 1, "dumpster_code": 1}
     )
-    if result.matched_count == 0:
+    if rental is None:
         raise HTTPException(status_code=404, detail="Nota não encontrada")
+    
+    await db.dumpsters.update_one(
+        {"code": dumpster_code_key(rental["dumpster_code"]), "current_rental_id": note_id},
+        {"$set": {"latitude": latitude, "longitude": longitude, "updated_at": next_updated_at()}}
+    )
+    
+    # Coordinates placed by hand are the best answer for this address next time
+    if rental.get("client_address"):
+        await remember_geocode(rental["client_address"], latitude, longitude)
     return {"message": "Coordenadas atualizadas com sucesso"}
 
 @api_router.get("/rental-notes/map-data")
-async def get_rental_notes_for_map():
-    """Get all rental notes with coordinates and status for map display"""
-    notes = await db.rental_notes.find().to_list(length=None)
+async def get_rental_notes_for_map(request: Request,
+                                   bbox: Optional[str] = None,
+                                   near: Optional[str] = None,
+                                   radius: float = Query(5000, gt=0, le=MAX_NEAR_RADIUS)):
+    """Get rental notes with coordinates and status for map display.
+
+    Without ``bbox``/``near`` every note with coordinates is returned.
+    """
+    query = map_data_query(bbox, near, radius)
+    notes = await db.rental_notes.find(query, model_projection(RentalNote)).to_list(length=None)
     result = []
     
     for note in notes:
-        parsed_note = parse_from_mongo(note)
-        rental_note = RentalNote(**parsed_note)
+        rental_note = from_trusted(note, RentalNote)
         
         # Only include notes with coordinates
-        if rental_note.latitude is not None and rental_note.longitude is not None:
-            # Calculate color status
-            color_status = calculate_rental_status_color(
-                rental_note.rental_date, 
-                rental_note.status
-            )
-            
+        if rental_note["latitude"] is not None and rental_note["longitude"] is not None:
             note_with_status = {
-                "id": rental_note.id,
-                "client_name": rental_note.client_name,
-                "client_address": rental_note.client_address,
-                "dumpster_code": rental_note.dumpster_code,
-                "dumpster_size": rental_note.dumpster_size,
-                "rental_date": rental_note.rental_date.isoformat(),
-                "status": rental_note.status,
-                "is_paid": rental_note.is_paid,
-                "price": rental_note.price,
-                "latitude": rental_note.latitude,
-                "longitude": rental_note.longitude,
-                "color_status": color_status,
-                "description": rental_note.description or ""
+                "id": rental_note["id"],
+                "client_name": rental_note["client_name"],
+                "client_address": rental_note["client_address"],
+                "dumpster_code": rental_note["dumpster_code"],
+                "dumpster_size": rental_note["dumpster_size"],
+                "rental_date": rental_note["rental_date"],
+                "status": rental_note["status"],
+                "is_paid": rental_note["is_paid"],
+                "price": rental_note["price"],
+                "latitude": rental_note["latitude"],
+                "longitude": rental_note["longitude"],
+                "color_status": calculate_rental_status_color(rental_note["rental_date"], rental_note["status"]),
+                "description": rental_note["description"] or ""
             }
             result.append(note_with_status)
     
-    return result
+    return json_response(result, request=request)
+
+@api_router.get("/rental-notes/map-clusters")
+async def get_rental_note_clusters(zoom: int = Query(..., ge=0, le=22),
+                                   bbox: Optional[str] = None,
+                                   near: Optional[str] = None,
+                                   radius: float = Query(5000, gt=0, le=MAX_NEAR_RADIUS)):
+    """Rental notes with coordinates bucketed into a zoom-dependent grid.
+
+    Each cell is about CLUSTER_CELL_PIXELS wide on screen at ``zoom``, so the
+    number of clusters depends on the viewport, not on the number of notes.
+    """
+    cell_size = 360 / (2 ** zoom) * CLUSTER_CELL_PIXELS / MAP_TILE_PIXELS  # degrees
+    expired_cutoff, overdue_cutoff = rental_age_cutoffs()
+    colors = ["green", "yellow", "purple", "red"]
+    
+    pipeline = [
+        {"$match": map_data_query(bbox, near, radius, sort_by_distance=False)},
+        {"$project": {
+            "id": 1,
+            "latitude": 1,
+            "longitude": 1,
+            "color_status": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$status", "retrieved"]}, "then": "red"},
+                    {"case": {"$lte": ["$rental_date", overdue_cutoff]}, "then": "purple"},
+                    {"case": {"$lte": ["$rental_date", expired_cutoff]}, "then": "yellow"}
+                ],
+                "default": "green"
+            }}
+        }},
+        {"$group": {
+            "_id": {
+                "x": {"$floor": {"$divide": ["$longitude", cell_size]}},
+                "y": {"$floor": {"$divide": ["$latitude", cell_size]}}
+            },
+            "count": {"$sum": 1},
+            "latitude": {"$avg": "$latitude"},
+            "longitude": {"$avg": "$longitude"},
+            "note_id": {"$first": "$id"},
+            **{color: {"$sum": {"$cond": [{"$eq": ["$color_status", color]}, 1, 0]}} for color in colors}
+        }}
+    ]
+    cells = await db.rental_notes.aggregate(pipeline).to_list(length=None)
+    
+    clusters = []
+    for cell in cells:
+        clusters.append({
+            "latitude": cell["latitude"],
+            "longitude": cell["longitude"],
+            "count": cell["count"],
+            "color_counts": {color: cell[color] for color in colors},
+            # Single-note cells can be drawn as a regular marker
+            "note_id": cell["note_id"] if cell["count"] == 1 else None
+        })
+    
+    return {
+        "zoom": zoom,
+        "cell_size": cell_size,
+        "total": sum(cluster["count"] for cluster in clusters),
+        "clusters": clusters
+    }
 
 @api_router.get("/rental-notes/with-status")
-async def get_rental_notes_with_status():
-    notes = await db.rental_notes.find().to_list(length=None)
-    result = []
+async def get_rental_notes_with_status(request: Request,
+                                       response: Response,
+                                       limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                                       after: Optional[str] = None,
+                                       order: SortOrder = SortOrder.ASC):
+    if accepts_ndjson(request):
+        return ndjson_response(page_cursor(db.rental_notes, {}, limit, after, order,
+                                           projection=model_projection(RentalNote)), with_color_status)
+    notes = await find_page(db.rental_notes, {}, response, limit, after, order,
+                            projection=model_projection(RentalNote))
+    return json_response([with_color_status(from_trusted(note, RentalNote)) for note in notes],
+                         response, request)
+
+@api_router.get("/rental-notes/board")
+async def get_rental_board(request: Request):
+    """All rental notes grouped by color status, in one database pass.
+
+    Replaces fetching with-status, active, retrieved, overdue and expired
+    separately: active = green + yellow + purple, retrieved = red,
+    expired = yellow, overdue = purple.
+    """
+    notes = await db.rental_notes.find({}, model_projection(RentalNote)) \
+        .sort([("created_at", 1), ("id", 1)]).to_list(length=None)
+    buckets = {"green": [], "yellow": [], "purple": [], "red": []}
     
     for note in notes:
-        parsed_note = parse_from_mongo(note)
-        rental_note = RentalNote(**parsed_note)
-        
-        # Calculate color status
-        color_status = calculate_rental_status_color(
-            rental_note.rental_date, 
-            rental_note.status
-        )
-        
-        note_with_status = rental_note.dict()
-        note_with_status["color_status"] = color_status
-        result.append(note_with_status)
+        note_with_status = with_color_status(from_trusted(note, RentalNote))
+        buckets[note_with_status["color_status"]].append(note_with_status)
     
-    return result
+    counts = {color: len(bucket) for color, bucket in buckets.items()}
+    counts["retrieved"] = counts["red"]
+    counts["active"] = len(notes) - counts["red"]
+    counts["total"] = len(notes)
+    
+    return json_response({
+        "buckets": buckets,
+        "counts": counts
+    }, request=request)
 
 # Dashboard stats
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats():
-    # Get all data
-    clients = await db.clients.find().to_list(length=None)
-    rentals = await db.rental_notes.find().to_list(length=None)
-    payments = await db.payments.find().to_list(length=None)
-    
-    total_clients = len(clients)
-    active_rentals = len([r for r in rentals if r.get('status') == 'active'])
-    retrieved_rentals = len([r for r in rentals if r.get('status') == 'retrieved'])
-    total_payments = len(payments)
-    
-    # Calculate overdue rentals (30+ days)
-    overdue_count = 0
-    expired_count = 0  # 7-30 days
-    for rental in rentals:
-        if rental.get('status') == 'active':
-            rental_date = rental.get('rental_date')
-            if isinstance(rental_date, str):
-                try:
-                    rental_date = datetime.fromisoformat(rental_date.replace('Z', '+00:00'))
-                except:
-                    continue
-            
-            color_status = calculate_rental_status_color(rental_date, rental.get('status'))
-            if color_status == 'purple':
-                overdue_count += 1
-            elif color_status == 'yellow':
-                expired_count += 1
+    # Counts run concurrently and come from counters, not from scanning notes
+    total_clients, rental_stats, age_counts, total_payments = await asyncio.gather(
+        db.clients.estimated_document_count(),
+        read_stats(STATS_GLOBAL),
+        count_active_by_age(),
+        db.payments.estimated_document_count()
+    )
     
     return {
         "total_clients": total_clients,
-        "active_dumpsters": active_rentals,
-        "retrieved_dumpsters": retrieved_rentals,
-        "overdue_dumpsters": overdue_count,
-        "expired_dumpsters": expired_count,
+        "active_dumpsters": rental_stats["active"],
+        "retrieved_dumpsters": rental_stats["retrieved"],
+        "overdue_dumpsters": age_counts["purple"],
+        "expired_dumpsters": age_counts["yellow"],
         "total_payments": total_payments
     }
 
 # Financial reports
-@api_router.post("/reports/detailed")
-async def generate_detailed_report(report_request: ReportRequest):
+async def aggregate_daily(collection, date_field: str, amount_field: str, details: Dict[str, str],
+                          start_date: datetime, end_date: datetime):
+    """Group the documents of a date range by day (UTC) inside MongoDB.
+
+    ``details`` maps each output key of the per-day detail entries to its
+    source field; missing values default to "" (or 0 for the amount field).
+    """
+    pipeline = [
+        {"$match": {date_field: {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${date_field}"}},
+            "count": {"$sum": 1},
+            "amount": {"$sum": {"$ifNull": [f"${amount_field}", 0]}},
+            "details": {"$push": {
+                key: {"$ifNull": [f"${field}", 0 if field == amount_field else ""]}
+                for key, field in details.items()
+            }}
+        }}
+    ]
+    return await collection.aggregate(pipeline).to_list(length=None)
+
+async def build_detailed_report(start_date: datetime, end_date: datetime) -> dict:
     """Generate detailed financial report for PDF export"""
-    start_date = report_request.start_date
-    end_date = report_request.end_date
-    
-    # Get rentals in date range
-    rentals = await db.rental_notes.find({}).to_list(length=None)
-    receivables = await db.receivables.find({}).to_list(length=None)
-    payments = await db.payments.find({}).to_list(length=None)
+    # Filter by date range and group by day in the database
+    rental_days, receivable_days, payment_days = await asyncio.gather(
+        aggregate_daily(db.rental_notes, 'rental_date', 'price', {
+            'client_name': 'client_name',
+            'dumpster_code': 'dumpster_code',
+            'dumpster_size': 'dumpster_size',
+            'amount': 'price'
+        }, start_date, end_date),
+        aggregate_daily(db.receivables, 'received_date', 'amount', {
+            'client_name': 'client_name',
+            'dumpster_code': 'dumpster_code',
+            'amount': 'amount'
+        }, start_date, end_date),
+        aggregate_daily(db.payments, 'due_date', 'amount', {
+            'account_name': 'account_name',
+            'description': 'description',
+            'amount': 'amount'
+        }, start_date, end_date)
+    )
     
-    # Filter by date range and organize by day
     daily_data = defaultdict(lambda: {
         'rentals': 0,
         'rental_amount': 0,
@@ -610,63 +1724,20 @@ async def generate_detailed_report(report_request: ReportRequest):
         'payment_details': []
     })
     
-    # Process rentals
-    for rental in rentals:
-        rental_date = rental.get('rental_date')
-        if isinstance(rental_date, str):
-            try:
-                rental_date = datetime.fromisoformat(rental_date.replace('Z', '+00:00'))
-            except:
-                continue
-        
-        if start_date <= rental_date <= end_date:
-            day_key = rental_date.strftime('%Y-%m-%d')
-            daily_data[day_key]['rentals'] += 1
-            daily_data[day_key]['rental_amount'] += rental.get('price', 0)
-            daily_data[day_key]['rental_details'].append({
-                'client_name': rental.get('client_name', ''),
-                'dumpster_code': rental.get('dumpster_code', ''),
-                'dumpster_size': rental.get('dumpster_size', ''),
-                'amount': rental.get('price', 0)
-            })
-    
-    # Process receivables
-    for receivable in receivables:
-        received_date = receivable.get('received_date')
-        if isinstance(received_date, str):
-            try:
-                received_date = datetime.fromisoformat(received_date.replace('Z', '+00:00'))
-            except:
-                continue
-        
-        if start_date <= received_date <= end_date:
-            day_key = received_date.strftime('%Y-%m-%d')
-            daily_data[day_key]['receivables'] += 1
-            daily_data[day_key]['receivable_amount'] += receivable.get('amount', 0)
-            daily_data[day_key]['receivable_details'].append({
-                'client_name': receivable.get('client_name', ''),
-                'dumpster_code': receivable.get('dumpster_code', ''),
-                'amount': receivable.get('amount', 0)
-            })
-    
-    # Process payments
-    for payment in payments:
-        due_date = payment.get('due_date')
-        if isinstance(due_date, str):
-            try:
-                due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
-            except:
-                continue
-        
-        if start_date <= due_date <= end_date:
-            day_key = due_date.strftime('%Y-%m-%d')
-            daily_data[day_key]['payments'] += 1
-            daily_data[day_key]['payment_amount'] += payment.get('amount', 0)
-            daily_data[day_key]['payment_details'].append({
-                'account_name': payment.get('account_name', ''),
-                'description': payment.get('description', ''),
-                'amount': payment.get('amount', 0)
-            })
+    for day in rental_days:
+        daily_data[day['_id']]['rentals'] = day['count']
+        daily_data[day['_id']]['rental_amount'] = day['amount']
+        daily_data[day['_id']]['rental_details'] = day['details']
+    
+    for day in receivable_days:
+        daily_data[day['_id']]['receivables'] = day['count']
+        daily_data[day['_id']]['receivable_amount'] = day['amount']
+        daily_data[day['_id']]['receivable_details'] = day['details']
+    
+    for day in payment_days:
+        daily_data[day['_id']]['payments'] = day['count']
+        daily_data[day['_id']]['payment_amount'] = day['amount']
+        daily_data[day['_id']]['payment_details'] = day['details']
     
     # Calculate totals
     total_rentals = sum(day['rentals'] for day in daily_data.values())
@@ -709,55 +1780,42 @@ async def generate_detailed_report(report_request: ReportRequest):
         }
     }
 
+@api_router.post("/reports/detailed")
+async def generate_detailed_report(report_request: ReportRequest, request: Request):
+    report = await build_detailed_report(report_request.start_date, report_request.end_date)
+    return json_response(report, request=request)
+
+@api_router.get("/reports/detailed")
+async def get_detailed_report(request: Request, start_date: datetime, end_date: datetime):
+    """Same report as the POST; a GET lets browsers revalidate it with If-None-Match"""
+    return json_response(await build_detailed_report(start_date, end_date), request=request)
+
 # Financial endpoints
 @api_router.get("/financial/monthly-summary")
-async def get_monthly_financial_summary():
+async def get_monthly_financial_summary(request: Request):
     """Get current month financial summary"""
     now = datetime.now(timezone.utc)
     start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
-    # Get receivables for current month
-    receivables = await db.receivables.find({}).to_list(length=None)
-    monthly_receivables = []
-    total_received = 0
+    # Get receivables and payments for current month
+    monthly_receivables = await db.receivables.find(
+        {"received_date": {"$gte": start_of_month}}, {"_id": 0}
+    ).to_list(length=None)
+    monthly_payments = await db.payments.find(
+        {"due_date": {"$gte": start_of_month}}, {"_id": 0}
+    ).to_list(length=None)
     
-    for receivable in receivables:
-        received_date = receivable.get('received_date')
-        if isinstance(received_date, str):
-            try:
-                received_date = datetime.fromisoformat(received_date.replace('Z', '+00:00'))
-            except:
-                continue
-        
-        if received_date >= start_of_month:
-            monthly_receivables.append(parse_from_mongo(receivable))
-            total_received += receivable.get('amount', 0)
-    
-    # Get payments for current month
-    payments = await db.payments.find({}).to_list(length=None)
-    monthly_payments = []
-    total_paid = 0
-    
-    for payment in payments:
-        due_date = payment.get('due_date')
-        if isinstance(due_date, str):
-            try:
-                due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
-            except:
-                continue
-        
-        if due_date >= start_of_month:
-            monthly_payments.append(parse_from_mongo(payment))
-            total_paid += payment.get('amount', 0)
+    total_received = sum(receivable.get('amount', 0) for receivable in monthly_receivables)
+    total_paid = sum(payment.get('amount', 0) for payment in monthly_payments)
     
-    return {
+    return json_response({
         "month": now.strftime("%B %Y"),
         "total_received": total_received,
         "total_paid": total_paid,
         "net_income": total_received - total_paid,
         "receivables": monthly_receivables,
         "payments": monthly_payments
-    }
+    }, request=request)
 
 # Payment endpoints
 @api_router.post("/payments", response_model=Payment)
@@ -767,34 +1825,59 @@ async def create_payment(payment_data: PaymentCreate):
     return payment
 
 @api_router.get("/payments", response_model=List[Payment])
-async def get_payments():
-    payments = await db.payments.find().to_list(length=None)
-    return [Payment(**parse_from_mongo(payment)) for payment in payments]
+async def get_payments(request: Request,
+                       response: Response,
+                       limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                       after: Optional[str] = None,
+                       order: SortOrder = SortOrder.ASC):
+    if accepts_ndjson(request):
+        return ndjson_response(page_cursor(db.payments, {}, limit, after, order,
+                                           projection=model_projection(Payment)))
+    payments = await find_page(db.payments, {}, response, limit, after, order,
+                               projection=model_projection(Payment))
+    return json_response([from_trusted(payment, Payment) for payment in payments], response, request)
 
 # Receivable endpoints
 @api_router.post("/receivables", response_model=Receivable)
 async def create_receivable(receivable_data: ReceivableCreate):
     receivable = Receivable(**receivable_data.dict())
-    await db.receivables.insert_one(prepare_for_mongo(receivable.dict()))
+    try:
+        await db.receivables.insert_one(prepare_for_mongo(receivable.dict()))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Recebimento já registrado para esta nota")
     return receivable
 
 @api_router.get("/receivables", response_model=List[Receivable])
-async def get_receivables():
-    receivables = await db.receivables.find().to_list(length=None)
-    return [Receivable(**parse_from_mongo(receivable)) for receivable in receivables]
+async def get_receivables(request: Request,
+                          response: Response,
+                          limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                          after: Optional[str] = None,
+                          order: SortOrder = SortOrder.ASC):
+    if accepts_ndjson(request):
+        return ndjson_response(page_cursor(db.receivables, {}, limit, after, order,
+                                           projection=model_projection(Receivable)))
+    receivables = await find_page(db.receivables, {}, response, limit, after, order,
+                                  projection=model_projection(Receivable))
+    return json_response([from_trusted(receivable, Receivable) for receivable in receivables], response, request)
 
 # Landfill endpoints
 @api_router.post("/landfills", response_model=Landfill)
 async def create_landfill(landfill_data: LandfillCreate):
     landfill = Landfill(**landfill_data.dict())
     await db.landfills.insert_one(prepare_for_mongo(landfill.dict()))
+    landfills_cache.invalidate()
     return landfill
 
-@api_router.get("/landfills", response_model=List[Landfill])
-async def get_landfills():
-    landfills = await db.landfills.find({"is_active": True}).to_list(length=None)
+async def load_active_landfills():
+    landfills = await db.landfills.find({"is_active": True}, {"_id": 0}).to_list(length=None)
     return [Landfill(**parse_from_mongo(landfill)) for landfill in landfills]
 
+landfills_cache = ReferenceCache(load_active_landfills)
+
+@api_router.get("/landfills", response_model=List[Landfill])
+async def get_landfills(request: Request, response: Response):
+    return await cached_reference_response(landfills_cache, request, response)
+
 @api_router.get("/landfills/{landfill_id}", response_model=Landfill)
 async def get_landfill(landfill_id: str):
     landfill = await db.landfills.find_one({"id": landfill_id})
@@ -810,52 +1893,216 @@ async def delete_landfill(landfill_id: str):
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Aterro não encontrado")
+    landfills_cache.invalidate()
     return {"message": "Aterro desativado com sucesso"}
 
+# Route optimization
+AVERAGE_SPEED_KMH = 30.0  # urban truck speed used for duration estimates
+STOP_SERVICE_MINUTES = 10  # time to drop off or pick up a dumpster
+ROUTE_OPTIMIZATION_BUDGET = 1.0  # seconds
+OR_OPT_MAX_SEGMENT = 3
+
+def haversine_matrix(latitudes, longitudes):
+    """Pairwise great-circle distances in km"""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lng = np.radians(np.asarray(longitudes, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def path_length(dist, path) -> float:
+    path = np.asarray(path)
+    return float(dist[path[:-1], path[1:]].sum())
+
+def nearest_neighbour_path(dist):
+    """Open path from node 0 to node n-1 visiting the nearest unvisited stop each time"""
+    n = len(dist)
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[[0, n - 1]] = False
+    path = [0]
+    for _ in range(n - 2):
+        candidates = np.where(unvisited, dist[path[-1]], np.inf)
+        nxt = int(np.argmin(candidates))
+        unvisited[nxt] = False
+        path.append(nxt)
+    path.append(n - 1)
+    return np.array(path)
+
+def two_opt_pass(dist, path, deadline) -> bool:
+    """Apply improving segment reversals; endpoints stay fixed"""
+    improved = False
+    last = len(path) - 2  # last reversible position
+    for i in range(1, last):
+        if time.monotonic() > deadline:
+            break
+        js = np.arange(i + 1, last + 1)
+        a, b = path[i - 1], path[i]
+        delta = (dist[a, path[js]] + dist[b, path[js + 1]]
+                 - dist[a, b] - dist[path[js], path[js + 1]])
+        best = int(np.argmin(delta))
+        if delta[best] < -1e-9:
+            j = js[best]
+            path[i:j + 1] = path[i:j + 1][::-1]
+            improved = True
+    return improved
+
+def or_opt_pass(dist, path, deadline) -> bool:
+    """Move segments of up to OR_OPT_MAX_SEGMENT stops (optionally reversed) elsewhere"""
+    improved = False
+    for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+        i = 1
+        while i + length < len(path):
+            if time.monotonic() > deadline:
+                return improved
+            segment = path[i:i + length]
+            prev, nxt = path[i - 1], path[i + length]
+            removal_gain = dist[prev, segment[0]] + dist[segment[-1], nxt] - dist[prev, nxt]
+            rest = np.concatenate([path[:i], path[i + length:]])
+            left, right = rest[:-1], rest[1:]
+            base = dist[left, right]
+            forward = dist[left, segment[0]] + dist[segment[-1], right] - base
+            backward = dist[left, segment[-1]] + dist[segment[0], right] - base
+            k_forward, k_backward = int(np.argmin(forward)), int(np.argmin(backward))
+            if backward[k_backward] < forward[k_forward]:
+                k, cost, segment = k_backward, backward[k_backward], segment[::-1]
+            else:
+                k, cost = k_forward, forward[k_forward]
+            if cost < removal_gain - 1e-9:
+                path[:] = np.concatenate([rest[:k + 1], segment, rest[k + 1:]])
+                improved = True
+            i += 1
+    return improved
+
+def optimize_path(dist, time_budget: float = ROUTE_OPTIMIZATION_BUDGET):
+    """Order stops for an open path from node 0 to node n-1.
+
+    Nearest-neighbour seed improved by alternating 2-opt and Or-opt passes
+    until no move helps or the time budget runs out.
+    """
+    path = nearest_neighbour_path(dist)
+    if len(path) <= 3:
+        return path
+    deadline = time.monotonic() + time_budget
+    while time.monotonic() < deadline:
+        improved = two_opt_pass(dist, path, deadline)
+        improved = or_opt_pass(dist, path, deadline) or improved
+        if not improved:
+            break
+    return path
+
+def plan_route(start, stops, end=None, optimize: bool = True):
+    """Order ``stops`` [(lat, lng)] from ``start`` to ``end`` (free when None).
+
+    Returns (stop order, total distance in km, per-stop arrival minutes,
+    total duration in minutes).
+    """
+    points = [start, *stops, end if end is not None else start]
+    dist = haversine_matrix([p[0] for p in points], [p[1] for p in points])
+    if end is None:
+        # A free end point is a dummy node at zero distance from every stop
+        dist[:, -1] = 0.0
+        dist[-1, :] = 0.0
+    
+    path = optimize_path(dist) if optimize else np.arange(len(points))
+    legs = dist[path[:-1], path[1:]]
+    
+    arrivals = []
+    elapsed = 0.0
+    for leg in legs[:-1]:
+        elapsed += leg / AVERAGE_SPEED_KMH * 60
+        arrivals.append(int(round(elapsed)))
+        elapsed += STOP_SERVICE_MINUTES
+    elapsed += legs[-1] / AVERAGE_SPEED_KMH * 60
+    
+    order = [int(node) - 1 for node in path[1:-1]]
+    return order, round(float(legs.sum()), 2), arrivals, int(round(elapsed))
+
 # Route endpoints
 @api_router.post("/routes", response_model=DeliveryRoute)
 async def create_delivery_route(route_data: RouteCreate):
-    # Create the route
+    # Fetch all rental notes of the route and the landfill
+    rentals, landfill = await asyncio.gather(
+        db.rental_notes.find(
+            {"id": {"$in": route_data.rental_note_ids}},
+            {"_id": 0, "id": 1, "latitude": 1, "longitude": 1}
+        ).to_list(length=None),
+        db.landfills.find_one({"id": route_data.landfill_id}, {"_id": 0, "latitude": 1, "longitude": 1})
+    )
+    rentals_by_id = {rental["id"]: rental for rental in rentals}
+    
+    # Only rental notes with coordinates become stops
+    stops = []
+    for rental_note_id in dict.fromkeys(route_data.rental_note_ids):
+        rental = rentals_by_id.get(rental_note_id)
+        if rental and rental.get('latitude') and rental.get('longitude'):
+            stops.append(rental)
+    
+    start = (route_data.start_latitude, route_data.start_longitude)
+    end = (landfill['latitude'], landfill['longitude']) if landfill else None
+    order, total_distance, arrivals, duration = await asyncio.to_thread(
+        plan_route,
+        start,
+        [(stop['latitude'], stop['longitude']) for stop in stops],
+        end,
+        route_data.optimize
+    )
+    
     route = DeliveryRoute(
         name=route_data.name,
         start_latitude=route_data.start_latitude,
         start_longitude=route_data.start_longitude,
-        landfill_id=route_data.landfill_id
+        landfill_id=route_data.landfill_id,
+        total_distance=total_distance,
+        estimated_duration=duration
     )
     
-    route_dict = prepare_for_mongo(route.dict())
-    await db.routes.insert_one(route_dict)
+    # estimated_duration of a waypoint is the arrival time in minutes from the start
+    waypoints = []
+    for sequence, (stop_idx, arrival) in enumerate(zip(order, arrivals), start=1):
+        stop = stops[stop_idx]
+        waypoint = RouteWaypoint(
+            route_id=route.id,
+            rental_note_id=stop['id'],
+            sequence=sequence,
+            latitude=stop['latitude'],
+            longitude=stop['longitude'],
+            estimated_duration=arrival
+        )
+        waypoints.append(prepare_for_mongo(waypoint.dict()))
     
-    # Create waypoints for each rental note
-    for idx, rental_note_id in enumerate(route_data.rental_note_ids):
-        # Get rental note coordinates
-        rental = await db.rental_notes.find_one({"id": rental_note_id})
-        if rental and rental.get('latitude') and rental.get('longitude'):
-            waypoint = RouteWaypoint(
-                route_id=route.id,
-                rental_note_id=rental_note_id,
-                sequence=idx + 1,
-                latitude=rental['latitude'],
-                longitude=rental['longitude']
-            )
-            waypoint_dict = prepare_for_mongo(waypoint.dict())
-            await db.waypoints.insert_one(waypoint_dict)
+    await db.routes.insert_one(prepare_for_mongo(route.dict()))
+    if waypoints:
+        await db.waypoints.insert_many(waypoints)
     
     return route
 
 @api_router.get("/routes", response_model=List[DeliveryRoute])
-async def get_routes():
-    routes = await db.routes.find().to_list(length=None)
-    return [DeliveryRoute(**parse_from_mongo(route)) for route in routes]
+async def get_routes(request: Request,
+                     response: Response,
+                     limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                     after: Optional[str] = None,
+                     order: SortOrder = SortOrder.ASC):
+    routes = await find_page(db.routes, {}, response, limit, after, order, sort_field="created_date",
+                             projection=model_projection(DeliveryRoute))
+    return json_response([from_trusted(route, DeliveryRoute) for route in routes], response, request)
 
 @api_router.get("/routes/{route_id}/waypoints")
 async def get_route_waypoints(route_id: str):
-    waypoints = await db.waypoints.find({"route_id": route_id}).sort("sequence").to_list(length=None)
+    waypoints = await db.waypoints.find({"route_id": route_id}, {"_id": 0}).sort("sequence").to_list(length=None)
+    
+    # Get rental info for every waypoint in one query
+    rental_note_ids = [waypoint['rental_note_id'] for waypoint in waypoints]
+    rentals = await db.rental_notes.find(
+        {"id": {"$in": rental_note_ids}},
+        {"_id": 0, "id": 1, "client_name": 1, "dumpster_code": 1, "client_address": 1}
+    ).to_list(length=None)
+    rentals_by_id = {rental["id"]: rental for rental in rentals}
+    
     result = []
     for waypoint in waypoints:
         waypoint_parsed = parse_from_mongo(waypoint)
-        # Get rental info
-        rental = await db.rental_notes.find_one({"id": waypoint['rental_note_id']})
+        rental = rentals_by_id.get(waypoint['rental_note_id'])
         if rental:
             waypoint_parsed["rental_info"] = {
                 "client_name": rental.get("client_name"),
@@ -865,35 +2112,757 @@ async def get_route_waypoints(route_id: str):
         result.append(waypoint_parsed)
     return result
 
-# Geocoding helper endpoint
+# Bulk import and export
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 100
+EXPORT_BATCH_SIZE = 500
+EXPORT_MODELS = {
+    "clients": Client,
+    "dumpster_types": DumpsterType,
+    "rental_notes": RentalNote,
+    "payments": Payment,
+    "receivables": Receivable,
+    "landfills": Landfill,
+    "routes": DeliveryRoute,
+    "waypoints": RouteWaypoint,
+}
+
+async def iter_body_lines(request: Request) -> AsyncIterator[str]:
+    """Decode the request body line by line without buffering all of it"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_import_records(request: Request):
+    """Yield (line number, record, error) from a CSV or NDJSON request body"""
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        header = None
+        pending, start = "", 0
+        line_no = 0
+        async for line in iter_body_lines(request):
+            line_no += 1
+            if not pending:
+                start = line_no
+            pending = f"{pending}\n{line}" if pending else line
+            if pending.count('"') % 2:
+                continue  # quoted field continues on the next line
+            row, pending = next(csv.reader([pending]), []), ""
+            if not row:
+                continue
+            if header is None:
+                header = [column.strip() for column in row]
+                continue
+            # Empty cells fall back to the model defaults
+            yield start, {key: value for key, value in zip(header, row) if value != ""}, None
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        line_no = 0
+        async for line in iter_body_lines(request):
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line), None
+            except ValueError as e:
+                yield line_no, None, f"JSON inválido: {e}"
+    else:
+        raise HTTPException(status_code=415, detail="Use text/csv ou application/x-ndjson")
+
+async def bulk_import(request: Request, collection, model, build_documents, on_inserted=None):
+    """Validate records in batches and insert them with unordered insert_many.
+
+    ``build_documents(batch)`` receives [(line, validated model)] and returns
+    ([(line, document)], [(line, error message)]). ``on_inserted(documents)``,
+    if given, is awaited with the documents of each batch that were written.
+    """
+    summary = {"inserted": 0, "failed": 0, "errors": []}
+    
+    def fail(line: int, message: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < IMPORT_MAX_ERRORS:
+            summary["errors"].append({"line": line, "error": message})
+    
+    async def flush(batch):
+        documents, errors = await build_documents(batch)
+        for line, message in errors:
+            fail(line, message)
+        if not documents:
+            return
+        failed = set()
+        try:
+            result = await collection.insert_many([doc for _, doc in documents], ordered=False)
+            summary["inserted"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            summary["inserted"] += e.details.get("nInserted", 0)
+            for write_error in e.details.get("writeErrors", []):
+                failed.add(write_error["index"])
+                fail(documents[write_error["index"]][0], write_error.get("errmsg", "Erro de escrita"))
+        if on_inserted:
+            await on_inserted([doc for index, (_, doc) in enumerate(documents) if index not in failed])
+    
+    batch = []
+    async for line, record, error in iter_import_records(request):
+        if error:
+            fail(line, error)
+            continue
+        try:
+            batch.append((line, model(**record)))
+        except (ValidationError, TypeError) as e:
+            fail(line, str(e))
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    
+    return summary
+
+@api_router.post("/import/clients")
+async def import_clients(request: Request):
+    """Bulk import clients from a CSV or NDJSON body.
+
+    ``id`` and ``created_at`` are kept when present, so rental notes exported
+    with their ``client_id`` still match after both files are imported.
+    """
+    async def build_documents(batch):
+        return [(line, client_document(Client(**data.dict()))) for line, data in batch], []
+    
+    return await bulk_import(request, db.clients, ClientImport, build_documents)
+
+@api_router.post("/import/rental-notes")
+async def import_rental_notes(request: Request):
+    """Bulk import rental notes from a CSV or NDJSON body.
+
+    ``id``, ``status``, ``is_paid`` and ``created_at`` are kept when present,
+    so historical notes and /export/rental_notes files import as they were.
+    Dumpsters are not claimed per row: the inventory is rebuilt afterwards.
+    """
+    async def build_documents(batch):
+        # One query resolves every registered client referenced by the batch
+        client_ids = list({data.client_id for _, data in batch if data.client_id})
+        clients = await db.clients.find(
+            {"id": {"$in": client_ids}},
+            {"_id": 0, "id": 1, "name": 1, "address": 1, "phone": 1}
+        ).to_list(length=None)
+        clients_by_id = {client["id"]: client for client in clients}
+        
+        documents, errors = [], []
+        for line, data in batch:
+            client = clients_by_id.get(data.client_id) if data.client_id else None
+            if data.client_id and client is None:
+                errors.append((line, "Cliente não encontrado"))
+            elif not data.client_id and (not data.client_name or not data.client_address):
+                errors.append((line, UNREGISTERED_CLIENT_REQUIRED))
+            else:
+                documents.append((line, rental_note_document(build_rental_note(data, client))))
+        return documents, errors
+    
+    imported_codes = set()
+    
+    async def on_inserted(documents):
+        imported_codes.update(doc["dumpster_code"] for doc in documents)
+        deltas = defaultdict(lambda: defaultdict(int))
+        days = defaultdict(int)
+        for doc in documents:
+            for field, value in rental_stats_delta(doc).items():
+                deltas[doc.get("client_id")][field] += value
+            for day, value in active_day_delta(doc).items():
+                days[day] += value
+        await apply_stats(deltas, days)
+    
+    summary = await bulk_import(request, db.rental_notes, RentalNoteImport, build_documents, on_inserted)
+    # Historical rows reuse the same dumpsters; the latest active note of each
+    # imported code is taken as its current rental
+    if imported_codes:
+        await rebuild_dumpsters(imported_codes)
+    return summary
+
+async def iter_export(cursor, fmt: str, columns: List[str]) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        async for doc in cursor:
+            values = [doc.get(column) for column in columns]
+            writer.writerow([
+                json_default(value) if isinstance(value, (datetime, Enum)) else value
+                for value in values
+            ])
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+    else:
+        async for line in iter_ndjson(cursor):
+            yield line
+
+@api_router.get("/export/{collection_name}")
+async def export_collection(collection_name: str, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Stream a whole collection as NDJSON or CSV"""
+    model = EXPORT_MODELS.get(collection_name)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Coleção não encontrada")
+    
+    # Internal fields (location, search_terms) are rebuilt on import
+    cursor = db[collection_name].find({}, model_projection(model)).batch_size(EXPORT_BATCH_SIZE)
+    media_type = "text/csv" if format == "csv" else NDJSON_MEDIA_TYPE
+    return StreamingResponse(
+        iter_export(cursor, format, list(model.model_fields)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{collection_name}.{format}"'}
+    )
+
+# Admin endpoints
+@api_router.get("/admin/indexes")
+async def get_index_stats():
+    """List the indexes of every collection with their usage counters"""
+    async def collection_index_stats(name: str):
+        stats = await db[name].aggregate([{"$indexStats": {}}]).to_list(length=None)
+        return [
+            {
+                "name": index["name"],
+                "key": index["key"],
+                "ops": index.get("accesses", {}).get("ops", 0),
+                "since": index.get("accesses", {}).get("since")
+            }
+            for index in stats
+        ]
+    
+    names = list(INDEXES)
+    results = await asyncio.gather(*[collection_index_stats(name) for name in names])
+    return dict(zip(names, results))
+
+# Geocoding
+GAZETTEER_PATH = Path(os.environ.get('GAZETTEER_PATH', ROOT_DIR / 'gazetteer.csv'))
+GEOCODE_LRU_SIZE = 4096
+GEOCODE_CITY_SUFFIX = "Itapira, SP"
+
+ADDRESS_ABBREVIATIONS = {
+    "r": "rua",
+    "av": "avenida",
+    "al": "alameda",
+    "pc": "praca",
+    "pca": "praca",
+    "tv": "travessa",
+    "rod": "rodovia",
+    "estr": "estrada",
+    "dr": "doutor",
+    "prof": "professor",
+    "cel": "coronel",
+    "sen": "senador",
+    "sta": "santa",
+    "sto": "santo",
+}
+ADDRESS_NUMBER_MARKERS = {"n", "no", "nro", "numero"}
+
+def normalize_address(address: str):
+    """Return (street key, house number) for a free-form address.
+
+    "R. Dr. João Silva, nº 123 - Centro" -> ("rua doutor joao silva", 123)
+    "Rua 13 de Maio, 100" -> ("rua 13 de maio", 100)
+
+    The number is taken after a nº marker, from the segment following a comma
+    or dash, or from the trailing token; numbers inside the street name stay.
+    """
+    text = unicodedata.normalize("NFKD", address).encode("ascii", "ignore").decode().lower()
+    # Thousands separators: "1.500" is number 1500
+    text = re.sub(r"\b\d{1,3}(?:\.\d{3})+\b", lambda match: match.group(0).replace(".", ""), text)
+    segments = re.split(r",|;| - ", text)
+    
+    tokens = re.findall(r"[a-z0-9]+", segments[0])
+    number = None
+    for idx, token in enumerate(tokens[:-1]):
+        if token in ADDRESS_NUMBER_MARKERS and tokens[idx + 1].isdigit():
+            number = int(tokens[idx + 1])
+            tokens = tokens[:idx]
+            break
+    
+    if number is None:
+        for segment in segments[1:]:
+            match = re.match(r"\s*(?:(?:n|no|nro|numero)\b\.?\s*)?(\d+)\b", segment)
+            if match:
+                number = int(match.group(1))
+                break
+    
+    # "Av. 7 de Setembro 45": a trailing number is the house number, unless
+    # it is all that names the street ("Rua 25")
+    if number is None and len(tokens) > 2 and tokens[-1].isdigit():
+        number = int(tokens.pop())
+    
+    street_tokens = [ADDRESS_ABBREVIATIONS.get(token, token) for token in tokens]
+    return " ".join(street_tokens), number
+
+def geocode_cache_key(street: str, number: Optional[int]) -> str:
+    return f"{street}|{number if number is not None else ''}"
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key):
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+class Gazetteer:
+    """In-memory street gazetteer loaded from a CSV file.
+
+    Columns: street, number, latitude, longitude. Rows without a number
+    give the street position; rows with numbers are used for exact matches
+    and for interpolating the numbers in between.
+    """
+    def __init__(self):
+        self.streets = {}  # street key -> {"numbers": [(n, lat, lng)], "center": (lat, lng)}
+
+    def load(self, path: Path) -> int:
+        streets = defaultdict(lambda: {"numbers": [], "points": []})
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                street, _ = normalize_address(row["street"])
+                point = (float(row["latitude"]), float(row["longitude"]))
+                number = (row.get("number") or "").strip()
+                if number.isdigit():
+                    streets[street]["numbers"].append((int(number), *point))
+                streets[street]["points"].append(point)
+        
+        self.streets = {
+            street: {
+                "numbers": sorted(entry["numbers"]),
+                "center": (
+                    sum(p[0] for p in entry["points"]) / len(entry["points"]),
+                    sum(p[1] for p in entry["points"]) / len(entry["points"])
+                )
+            }
+            for street, entry in streets.items()
+        }
+        return len(self.streets)
+
+    def lookup(self, street: str, number: Optional[int]):
+        """Return (latitude, longitude, confidence, match) or None"""
+        entry = self.streets.get(street)
+        if entry is None:
+            return None
+        numbers = entry["numbers"]
+        if number is None or not numbers:
+            return (*entry["center"], 0.6, "street")
+        
+        idx = bisect.bisect_left(numbers, (number,))
+        if idx < len(numbers) and numbers[idx][0] == number:
+            return (numbers[idx][1], numbers[idx][2], 1.0, "exact")
+        if 0 < idx < len(numbers):
+            (n0, lat0, lng0), (n1, lat1, lng1) = numbers[idx - 1], numbers[idx]
+            t = (number - n0) / (n1 - n0)
+            return (lat0 + t * (lat1 - lat0), lng0 + t * (lng1 - lng0), 0.9, "interpolated")
+        _, lat, lng = numbers[0] if idx == 0 else numbers[-1]
+        return (lat, lng, 0.7, "nearest_number")
+
+gazetteer = Gazetteer()
+geocode_lru = LRUCache(GEOCODE_LRU_SIZE)
+
+@app.on_event("startup")
+async def load_gazetteer():
+    if not GAZETTEER_PATH.exists():
+        logger.warning(f"Gazetteer {GAZETTEER_PATH} not found; geocoding will only use cached results")
+        return
+    streets = await asyncio.to_thread(gazetteer.load, GAZETTEER_PATH)
+    logger.info(f"Gazetteer loaded with {streets} streets from {GAZETTEER_PATH}")
+
+async def remember_geocode(address: str, latitude: float, longitude: float,
+                           confidence: float = 1.0, match: str = "manual"):
+    """Store a resolved address in the LRU and the persistent geocode_cache"""
+    street, number = normalize_address(address)
+    key = geocode_cache_key(street, number)
+    result = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "display_name": f"{address}, {GEOCODE_CITY_SUFFIX}",
+        "confidence": confidence,
+        "match": match
+    }
+    geocode_lru.put(key, result)
+    await db.geocode_cache.update_one(
+        {"_id": key},
+        {"$set": {**result, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return result
+
+async def resolve_address(address: str):
+    """Geocode an address: LRU, then geocode_cache collection, then gazetteer"""
+    street, number = normalize_address(address)
+    if not street:
+        return None
+    key = geocode_cache_key(street, number)
+    
+    result = geocode_lru.get(key)
+    if result is not None:
+        return result
+    
+    cached = await db.geocode_cache.find_one({"_id": key}, {"_id": 0, "updated_at": 0})
+    if cached:
+        geocode_lru.put(key, cached)
+        return cached
+    
+    found = gazetteer.lookup(street, number)
+    if found is None:
+        return None
+    latitude, longitude, confidence, match = found
+    return await remember_geocode(address, latitude, longitude, confidence, match)
+
 @api_router.get("/geocode/{address}")
 async def geocode_address(address: str):
-    """Simple geocoding for Itapira addresses - placeholder for real geocoding service"""
-    # For now, return approximate coordinates for Itapira center with small random offset
-    import random
-    base_lat = -22.4386
-    base_lng = -46.8289
+    """Geocode an Itapira address with the local gazetteer, without network access"""
+    result = await resolve_address(address)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Endereço não encontrado")
+    return result
+
+# Geocoding backfill
+GEOCODE_BACKFILL_JOB = "geocode_backfill"
+GEOCODE_BACKFILL_BATCH = 500
+GEOCODE_BACKFILL_CONCURRENCY = 8
+geocode_backfill_task: Optional[asyncio.Task] = None
+geocode_backfill_lock = asyncio.Lock()
+
+async def save_geocode_backfill_progress(progress: dict):
+    progress["updated_at"] = datetime.now(timezone.utc)
+    await db.jobs.update_one({"_id": GEOCODE_BACKFILL_JOB}, {"$set": progress}, upsert=True)
+
+async def begin_geocode_backfill() -> dict:
+    """Record a run as started and return its progress.
+
+    A run that was interrupted keeps its counters and continues after the
+    last processed note.
+    """
+    state = await db.jobs.find_one({"_id": GEOCODE_BACKFILL_JOB}) or {}
+    resuming = state.get("status") == "running"
+    progress = {
+        "status": "running",
+        "processed": state.get("processed", 0) if resuming else 0,
+        "updated": state.get("updated", 0) if resuming else 0,
+        "not_found": state.get("not_found", 0) if resuming else 0,
+        "last_id": state.get("last_id") if resuming else None,
+        "started_at": state.get("started_at") if resuming else datetime.now(timezone.utc),
+        "error": None
+    }
+    await save_geocode_backfill_progress(progress)
+    return progress
+
+async def run_geocode_backfill(batch_size: int = GEOCODE_BACKFILL_BATCH,
+                               concurrency: int = GEOCODE_BACKFILL_CONCURRENCY,
+                               progress: Optional[dict] = None):
+    """Geocode rental notes without coordinates, batch by batch.
+
+    Progress is kept in the ``jobs`` collection after each batch. ``progress``
+    comes from begin_geocode_backfill, which is called here when not given.
+    """
+    if progress is None:
+        progress = await begin_geocode_backfill()
     
-    # Add small random offset to simulate different addresses
-    offset_lat = random.uniform(-0.05, 0.05)
-    offset_lng = random.uniform(-0.05, 0.05)
+    async def save_progress():
+        await save_geocode_backfill_progress(progress)
     
-    return {
-        "latitude": base_lat + offset_lat,
-        "longitude": base_lng + offset_lng,
-        "display_name": f"{address}, Itapira, SP",
-        "confidence": 0.8
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def geocode(address: str):
+        async with semaphore:
+            return address, await resolve_address(address)
+    
+    pending = {
+        "$or": [{"latitude": None}, {"longitude": None}],
+        "client_address": {"$nin": [None, ""]}
     }
+    try:
+        while True:
+            query = pending if progress["last_id"] is None else {**pending, "_id": {"$gt": progress["last_id"]}}
+            batch = await db.rental_notes.find(query, {"client_address": 1}) \
+                .sort("_id", 1).limit(batch_size).to_list(length=None)
+            if not batch:
+                break
+            
+            # Each distinct address is geocoded once per batch
+            addresses = {doc["client_address"] for doc in batch}
+            results = dict(await asyncio.gather(*[geocode(address) for address in addresses]))
+            
+            operations = []
+            for doc in batch:
+                result = results[doc["client_address"]]
+                if result is None:
+                    progress["not_found"] += 1
+                    continue
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+                    "latitude": result["latitude"],
+                    "longitude": result["longitude"],
+                    "location": geo_point(result["latitude"], result["longitude"]),
+                    "updated_at": next_updated_at()
+                }}))
+            if operations:
+                write = await db.rental_notes.bulk_write(operations, ordered=False)
+                progress["updated"] += write.modified_count
+            
+            progress["processed"] += len(batch)
+            progress["last_id"] = batch[-1]["_id"]
+            await save_progress()
+        
+        progress["status"] = "completed"
+        progress["last_id"] = None
+    except Exception as e:
+        logger.exception("Geocoding backfill failed")
+        progress["status"] = "failed"
+        progress["error"] = str(e)
+    finally:
+        await save_progress()
+    return progress
+
+def geocode_backfill_status(state: Optional[dict]):
+    state = dict(state or {"status": "idle"})
+    state.pop("_id", None)
+    state.pop("last_id", None)
+    state["running"] = geocode_backfill_task is not None and not geocode_backfill_task.done()
+    return state
+
+@app.on_event("startup")
+async def resume_geocode_backfill():
+    global geocode_backfill_task
+    state = await db.jobs.find_one({"_id": GEOCODE_BACKFILL_JOB}, {"status": 1})
+    if state and state.get("status") == "running":
+        logger.info("Resuming interrupted geocoding backfill")
+        geocode_backfill_task = asyncio.create_task(run_geocode_backfill())
+
+@api_router.post("/admin/geocode-backfill")
+async def start_geocode_backfill():
+    """Start geocoding rental notes without coordinates in the background"""
+    global geocode_backfill_task
+    async with geocode_backfill_lock:
+        if geocode_backfill_task is None or geocode_backfill_task.done():
+            # The running state is stored before the status below is read
+            progress = await begin_geocode_backfill()
+            geocode_backfill_task = asyncio.create_task(run_geocode_backfill(progress=progress))
+    return geocode_backfill_status(await db.jobs.find_one({"_id": GEOCODE_BACKFILL_JOB}))
+
+@api_router.get("/admin/geocode-backfill")
+async def get_geocode_backfill():
+    """Progress of the geocoding backfill job"""
+    return geocode_backfill_status(await db.jobs.find_one({"_id": GEOCODE_BACKFILL_JOB}))
+
+# Live change events
+EVENT_POLL_INTERVAL = 3  # seconds between polls when change streams are unavailable
+EVENT_HEARTBEAT = 15  # seconds
+EVENT_QUEUE_SIZE = 1000
+EVENT_OPERATIONS = ["insert", "update", "replace", "delete"]
+
+EVENT_MODELS = {"rental_notes": RentalNote, "payments": Payment, "receivables": Receivable}
+TOMBSTONED_COLLECTIONS = {"clients", "rental_notes"}  # every delete goes through record_tombstone
+
+def event_document(collection_name: str, doc: dict) -> dict:
+    model = EVENT_MODELS[collection_name]
+    document = from_trusted({key: value for key, value in doc.items() if key in model.model_fields}, model)
+    if collection_name == "rental_notes":
+        document = with_color_status(document)
+    return document
+
+class ChangeBroker:
+    """Fan out changes of the watched collections to event stream subscribers.
+
+    One watcher runs while anyone is subscribed. It follows a MongoDB change
+    stream and falls back to polling updated_at and tombstones when the
+    server does not support change streams (standalone mongod).
+    """
+    def __init__(self):
+        self._subscribers = set()
+        self._task = None
+    
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers:
+            self.close()
+    
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    def publish(self, event: dict):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A subscriber that fell behind reloads everything instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"collection": None, "op": "reset"})
+    
+    async def _run(self):
+        while True:
+            try:
+                await self._watch()
+            except OperationFailure as e:
+                logger.info(f"Change streams unavailable, polling for changes: {e}")
+                await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Change stream failed; restarting")
+                self.publish({"collection": None, "op": "reset"})
+                await asyncio.sleep(EVENT_POLL_INTERVAL)
+    
+    async def _watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": [*EVENT_MODELS, "tombstones"]},
+            "operationType": {"$in": EVENT_OPERATIONS}
+        }}]
+        async with db.watch(pipeline, full_document="updateLookup") as stream:
+            async for change in stream:
+                collection_name = change["ns"]["coll"]
+                operation = change["operationType"]
+                if collection_name == "tombstones":
+                    # Deletes made through the API leave a tombstone with the id
+                    tombstone = change.get("fullDocument") or {}
+                    if operation != "delete" and tombstone.get("collection") in EVENT_MODELS:
+                        self.publish({"collection": tombstone["collection"], "op": "delete", "id": tombstone["id"]})
+                elif operation == "delete":
+                    # Without pre-images only the _id is known; other deletes reload the collection
+                    if collection_name not in TOMBSTONED_COLLECTIONS:
+                        self.publish({"collection": collection_name, "op": "reset"})
+                elif change.get("fullDocument") is not None:
+                    document = event_document(collection_name, change["fullDocument"])
+                    self.publish({
+                        "collection": collection_name,
+                        "op": "insert" if operation == "insert" else "update",
+                        "id": document.get("id"),
+                        "document": document
+                    })
+    
+    async def _poll(self):
+        """Publish what changed since the last poll, by updated_at and tombstones.
+
+        Each round re-reads a SYNC_OVERLAP window for writes of other workers
+        committed late; documents already published with the same updated_at
+        are skipped.
+        """
+        watermark = next_updated_at()
+        published = {}  # (collection, id) -> updated_at, for the overlap window
+        while True:
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+            since = watermark - SYNC_OVERLAP
+            watermark = next_updated_at()
+            query = {"updated_at": {"$gt": since}}
+            published = {key: updated_at for key, updated_at in published.items() if updated_at > since}
+            
+            for collection_name, model in EVENT_MODELS.items():
+                async for doc in db[collection_name].find(query, model_projection(model)).sort("updated_at", 1):
+                    key = (collection_name, doc.get("id"))
+                    if doc.get("id") is None or published.get(key) == doc["updated_at"]:
+                        continue
+                    created_at = doc.get("created_at")
+                    inserted = key not in published and isinstance(created_at, datetime) and created_at > since
+                    published[key] = doc["updated_at"]
+                    self.publish({
+                        "collection": collection_name,
+                        "op": "insert" if inserted else "update",
+                        "id": doc["id"],
+                        "document": event_document(collection_name, doc)
+                    })
+            
+            tombstones = db.tombstones.find(
+                {**query, "collection": {"$in": list(EVENT_MODELS)}},
+                {"_id": 0, "collection": 1, "id": 1, "updated_at": 1}
+            ).sort("updated_at", 1)
+            async for tombstone in tombstones:
+                key = ("tombstones", tombstone["id"])
+                if published.get(key) == tombstone["updated_at"]:
+                    continue
+                published[key] = tombstone["updated_at"]
+                self.publish({"collection": tombstone["collection"], "op": "delete", "id": tombstone["id"]})
+
+change_broker = ChangeBroker()
+
+@api_router.get("/events")
+async def stream_events(request: Request):
+    """Server-Sent Events feed of rental note, payment and receivable changes.
+
+    Each ``change`` event carries {collection, op, id, document}; op is insert,
+    update, delete or reset (reload the collection, or everything when
+    collection is null).
+    """
+    queue = change_broker.subscribe()
+    
+    async def events():
+        try:
+            yield f"retry: {EVENT_POLL_INTERVAL * 1000}\n\n".encode()
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), EVENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keep-alive\n\n"
+                    continue
+                yield b"event: change\ndata: " + orjson.dumps(event, default=json_default) + b"\n\n"
+        finally:
+            change_broker.unsubscribe(queue)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.on_event("shutdown")
+async def stop_change_broker():
+    change_broker.close()
 
 # Include the router in the main app
 app.include_router(api_router)
 
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are not worth the CPU
+
+class CompressionMiddleware:
+    """GZip responses larger than COMPRESSION_MIN_SIZE for clients that accept it.
+
+    The event stream is passed through untouched: compressing it would hold
+    events in the gzip buffer instead of delivering them.
+    """
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] != "/api/events":
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "ETag"],
 )
 
 # Configure logging
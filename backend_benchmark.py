@@ -0,0 +1,168 @@
+import requests
+import sys
+import os
+import json
+import time
+import statistics
+import uuid
+from datetime import datetime, timedelta, timezone
+
+
+class DiskEntulhoAPIBenchmark:
+    def __init__(self, base_url="https://28bd7347-0792-4662-9a4e-de26a1de2e4e.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.session = requests.Session()
+        self.created_rental_ids = []
+
+    def timed(self, method, endpoint, repeat=5, **kwargs):
+        """Run a request `repeat` times and return (median ms, last response)"""
+        url = f"{self.api_url}/{endpoint}"
+        timings = []
+        response = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = self.session.request(method, url, **kwargs)
+            timings.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+        return statistics.median(timings), response
+
+    def create_rental_notes(self, count):
+        """Create rental notes with coordinates spread around Itapira"""
+        while len(self.created_rental_ids) < count:
+            idx = len(self.created_rental_ids)
+            response = self.session.post(f"{self.api_url}/rental-notes", json={
+                "client_name": f"Cliente Benchmark {idx}",
+                "client_address": f"Rua Benchmark, {idx}",
+                "dumpster_code": f"BENCH{idx:03d}",
+                "dumpster_size": "Pequena",
+                "rental_date": datetime.now().isoformat(),
+                "price": 150.0,
+                "latitude": -22.4386 + (idx % 10) * 0.004,
+                "longitude": -46.8289 + (idx // 10) * 0.004
+            })
+            response.raise_for_status()
+            self.created_rental_ids.append(response.json()['id'])
+
+    def cleanup(self):
+        for rental_id in self.created_rental_ids:
+            self.session.delete(f"{self.api_url}/rental-notes/{rental_id}")
+
+    def bench_route_stops(self, stop_counts=(5, 10, 20, 30, 50)):
+        """Route creation and waypoint listing latency by number of stops"""
+        print(f"\n{'stops':>6} {'POST /routes (ms)':>18} {'GET waypoints (ms)':>19}")
+        self.create_rental_notes(max(stop_counts))
+        for stops in stop_counts:
+            create_ms, response = self.timed("POST", "routes", json={
+                "name": f"Rota Benchmark {stops}",
+                "start_latitude": -22.4386,
+                "start_longitude": -46.8289,
+                "landfill_id": "benchmark",
+                "rental_note_ids": self.created_rental_ids[:stops]
+            })
+            route_id = response.json()['id']
+            list_ms, _ = self.timed("GET", f"routes/{route_id}/waypoints")
+            print(f"{stops:>6} {create_ms:>18.1f} {list_ms:>19.1f}")
+
+    def bench_list_throughput(self, endpoints=("rental-notes", "rental-notes/with-status"), seconds=5):
+        """Sequential requests/sec on the list endpoints"""
+        print(f"\n{'endpoint':<28} {'req/s':>8} {'median (ms)':>12}")
+        for endpoint in endpoints:
+            timings = []
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                self.session.get(f"{self.api_url}/{endpoint}").raise_for_status()
+                timings.append(time.perf_counter() - start)
+            print(f"{endpoint:<28} {len(timings) / sum(timings):>8.1f} {statistics.median(timings) * 1000:>12.1f}")
+
+    def wire_bytes(self, endpoint, headers, params=None):
+        """(status, body bytes as sent before content decoding, ETag)"""
+        response = self.session.get(f"{self.api_url}/{endpoint}", headers=headers, params=params, stream=True)
+        body = response.raw.read(decode_content=False)
+        return response.status_code, len(body), response.headers.get("ETag")
+
+    def bench_bytes_on_wire(self, endpoints=("rental-notes/with-status", "rental-notes/board",
+                                             "financial/monthly-summary", "reports/detailed")):
+        """Body size uncompressed, gzipped and for an unchanged (304) repeat"""
+        end = datetime.now(timezone.utc)
+        params = {"start_date": (end - timedelta(days=90)).isoformat(), "end_date": end.isoformat()}
+        print(f"\n{'endpoint':<28} {'identity':>10} {'gzip':>10} {'saved':>7} {'304':>6}")
+        for endpoint in endpoints:
+            _, plain, etag = self.wire_bytes(endpoint, {"Accept-Encoding": "identity"}, params)
+            _, gzipped, _ = self.wire_bytes(endpoint, {"Accept-Encoding": "gzip"}, params)
+            status, revalidated, _ = self.wire_bytes(
+                endpoint, {"Accept-Encoding": "gzip", "If-None-Match": etag or ""}, params)
+            saved = 100 * (1 - gzipped / plain) if plain else 0
+            not_modified = f"{revalidated}" if status == 304 else "-"
+            print(f"{endpoint:<28} {plain:>10} {gzipped:>10} {saved:>6.1f}% {not_modified:>6}")
+
+
+def bench_serialization(count=10000):
+    """Offline cost of turning rental note documents into a JSON body.
+
+    Compares building a Pydantic model per document with the trusted
+    projection path used by the list endpoints.
+    """
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "benchmark")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+    from fastapi.encoders import jsonable_encoder
+    import orjson
+    from server import RentalNote, calculate_rental_status_color, from_trusted, with_color_status
+
+    now = datetime.now(timezone.utc)
+    docs = [{
+        "id": str(uuid.uuid4()),
+        "client_name": f"Cliente {idx}",
+        "client_address": f"Rua Benchmark, {idx}",
+        "dumpster_code": f"B{idx:05d}",
+        "dumpster_size": "Pequena",
+        "rental_date": now - timedelta(days=idx % 40),
+        "price": 150.0,
+        "status": "active",
+        "is_paid": False,
+        "created_at": now,
+        "latitude": -22.4386,
+        "longitude": -46.8289,
+    } for idx in range(count)]
+
+    def validated():
+        result = []
+        for doc in docs:
+            note = RentalNote(**doc).dict()
+            note["color_status"] = calculate_rental_status_color(note["rental_date"], note["status"])
+            result.append(note)
+        return json.dumps(jsonable_encoder(result)).encode()
+
+    def trusted():
+        return orjson.dumps([with_color_status(from_trusted(doc, RentalNote)) for doc in docs])
+
+    print(f"\n{'serializer (' + str(count) + ' notes)':<32} {'ms':>8}")
+    for name, func in (("pydantic + json", validated), ("trusted + orjson", trusted)):
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:<32} {statistics.median(timings):>8.1f}")
+
+
+def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else None
+    benchmark = DiskEntulhoAPIBenchmark(base_url) if base_url else DiskEntulhoAPIBenchmark()
+    print("⏱️  Disk Entulho Marchioretto API Benchmarks")
+    print("=" * 60)
+
+    bench_serialization()
+    try:
+        benchmark.bench_route_stops()
+        benchmark.bench_list_throughput()
+        benchmark.bench_bytes_on_wire()
+    finally:
+        benchmark.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
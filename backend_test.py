@@ -1,6 +1,7 @@
 import requests
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import uuid
 
@@ -12,6 +13,7 @@ class DiskEntulhoAPITester:
         self.tests_passed = 0
         self.created_client_id = None
         self.created_rental_id = None
+        self.created_rental_code = None
 
     def run_test(self, name, method, endpoint, expected_status, data=None, params=None):
         """Run a single API test"""
@@ -144,6 +146,39 @@ class DiskEntulhoAPITester:
         
         return success
 
+    def test_clients_pagination(self):
+        """Test GET /api/clients with limit/after cursor pagination"""
+        url = f"{self.api_url}/clients"
+        self.tests_run += 1
+        print(f"\n🔍 Testing Clients Pagination...")
+        print(f"   URL: {url}?limit=2")
+        
+        try:
+            first_page = requests.get(url, params={"limit": 2})
+            total = first_page.headers.get('X-Total-Count')
+            next_cursor = first_page.headers.get('X-Next-Cursor')
+            print(f"   Total count header: {total}")
+            
+            if first_page.status_code != 200 or total is None or len(first_page.json()) > 2:
+                print(f"❌ Failed - Status: {first_page.status_code}, items: {len(first_page.json())}")
+                return False
+            
+            if next_cursor:
+                second_page = requests.get(url, params={"limit": 2, "after": next_cursor})
+                first_ids = {c['id'] for c in first_page.json()}
+                overlap = [c for c in second_page.json() if c['id'] in first_ids]
+                if overlap:
+                    print(f"❌ Failed - Second page repeats {len(overlap)} clients")
+                    return False
+                print(f"   ✅ Second page returned {len(second_page.json())} new clients")
+            
+            self.tests_passed += 1
+            print(f"✅ Passed - Pagination headers present")
+            return True
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+
     def test_create_rental_note(self):
         """Test POST /api/rental-notes"""
         if not self.created_client_id:
@@ -172,12 +207,46 @@ class DiskEntulhoAPITester:
         
         if success and 'id' in response:
             self.created_rental_id = response['id']
+            self.created_rental_code = response['dumpster_code']
             print(f"   ✅ Rental note created with ID: {self.created_rental_id}")
             print(f"   ✅ Status: {response.get('status')}")
             print(f"   ✅ Is Paid: {response.get('is_paid')}")
         
         return success
 
+    def test_dumpster_inventory(self):
+        """Test GET /api/dumpsters/{code} and double-booking rejection"""
+        if not self.created_rental_code:
+            print("   ❌ Cannot test inventory - no rental created")
+            return False
+        
+        success, response = self.run_test(
+            "Get Dumpster By Code",
+            "GET",
+            f"dumpsters/{self.created_rental_code}",
+            200
+        )
+        if success:
+            if response.get('status') == 'rented' and response.get('current_rental_id') == self.created_rental_id:
+                print(f"   ✅ Dumpster {self.created_rental_code} is out with the test rental")
+            else:
+                print(f"   ❌ Unexpected dumpster state: {response}")
+        
+        double_booked, _ = self.run_test(
+            "Reject Double Booking",
+            "POST",
+            "rental-notes",
+            409,
+            data={
+                "client_id": self.created_client_id,
+                "dumpster_code": self.created_rental_code,
+                "dumpster_size": "Média",
+                "rental_date": datetime.now().isoformat(),
+                "price": 250.0
+            }
+        )
+        return success and double_booked
+
     def test_get_rental_notes_with_status(self):
         """Test GET /api/rental-notes/with-status"""
         success, response = self.run_test(
@@ -249,7 +318,34 @@ class DiskEntulhoAPITester:
         if success:
             print(f"   ✅ Rental marked as paid")
         
-        return success
+        # Paying again, also concurrently, must not record a second receivable
+        repeated, _ = self.run_test(
+            "Mark Rental as Paid Again",
+            "PUT",
+            f"rental-notes/{self.created_rental_id}/pay",
+            200
+        )
+        url = f"{self.api_url}/rental-notes/{self.created_rental_id}/pay"
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            statuses = list(executor.map(lambda _: requests.put(url).status_code, range(3)))
+        print(f"   Concurrent payment statuses: {statuses}")
+        
+        listed, receivables = self.run_test(
+            "Get Receivables",
+            "GET",
+            "receivables",
+            200
+        )
+        matching = [r for r in receivables if r.get('rental_note_id') == self.created_rental_id] if listed else []
+        single = len(matching) == 1 and all(status == 200 for status in statuses)
+        self.tests_run += 1
+        if single:
+            self.tests_passed += 1
+            print(f"   ✅ Exactly one receivable recorded for the rental")
+        else:
+            print(f"   ❌ Expected one receivable for the rental, found {len(matching)}")
+        
+        return success and repeated and single
 
     def test_client_stats(self):
         """Test GET /api/clients/{id}/stats"""
@@ -381,6 +477,33 @@ class DiskEntulhoAPITester:
         
         return success1 and success2 and success3
 
+    def test_rental_board(self):
+        """Test GET /api/rental-notes/board - notes grouped by color status"""
+        success, response = self.run_test(
+            "Get Rental Board",
+            "GET",
+            "rental-notes/board",
+            200
+        )
+        
+        if success:
+            buckets = response.get('buckets', {})
+            counts = response.get('counts', {})
+            for color in ['green', 'yellow', 'purple', 'red']:
+                if color in buckets and counts.get(color) == len(buckets[color]):
+                    print(f"   ✅ {color}: {counts[color]} notes")
+                else:
+                    print(f"   ❌ Bucket {color} missing or count mismatch")
+            
+            if self.created_rental_id:
+                found = any(r.get('id') == self.created_rental_id for r in buckets.get('red', []))
+                if found:
+                    print(f"   ✅ Retrieved test rental found in red bucket")
+                else:
+                    print(f"   ❌ Retrieved test rental not found in red bucket")
+        
+        return success
+
     def test_dashboard_stats(self):
         """Test GET /api/dashboard/stats - Dashboard functionality"""
         success, response = self.run_test(
@@ -474,7 +597,9 @@ def main():
         ("Dumpster Types", tester.test_dumpster_types),
         ("Create Client", tester.test_create_client),
         ("Get Clients", tester.test_get_clients),
+        ("Clients Pagination", tester.test_clients_pagination),
         ("Create Rental Note", tester.test_create_rental_note),
+        ("Dumpster Inventory", tester.test_dumpster_inventory),
         ("Get Rental Notes with Status", tester.test_get_rental_notes_with_status),
         ("Mark as Retrieved", tester.test_mark_as_retrieved),
         ("Mark as Paid", tester.test_mark_as_paid),
@@ -482,6 +607,7 @@ def main():
         ("Verify Status Changes", tester.test_verify_status_changes),
         ("Update Dumpster Price", tester.test_update_dumpster_price),
         ("Rental Filters", tester.test_rental_filters),
+        ("Rental Board", tester.test_rental_board),
         ("Dashboard Stats", tester.test_dashboard_stats),
         ("Financial Summary", tester.test_financial_summary),
         ("Unregistered Client Rental", tester.test_unregistered_client_rental),
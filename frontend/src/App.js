@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import './App.css';
 import './leaflet.css';
 import axios from 'axios';
@@ -13,7 +13,7 @@ import { Textarea } from './components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from './components/ui/select';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from './components/ui/tabs';
 import { Switch } from './components/ui/switch';
-import RealMap from './components/RealMap';
+import RealMap, { CLUSTER_MAX_ZOOM } from './components/RealMap';
 import jsPDF from 'jspdf';
 import 'jspdf-autotable';
 import { Chart as ChartJS, CategoryScale, LinearScale, BarElement, LineElement, PointElement, Title, Tooltip, Legend } from 'chart.js';
@@ -24,6 +24,7 @@ ChartJS.register(CategoryScale, LinearScale, BarElement, LineElement, PointEleme
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const STATS_REFRESH_DELAY = 1000; // ms; coalesces dashboard refreshes during change bursts
 
 function App() {
   const [activeTab, setActiveTab] = useState('dashboard');
@@ -40,10 +41,13 @@ function App() {
   const [dashboardStats, setDashboardStats] = useState({});
   const [loading, setLoading] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const [editingClient, setEditingClient] = useState(null);
   
   // Map states
   const [mapData, setMapData] = useState([]);
+  const mapViewport = useRef(null);
+  const mapDataRequest = useRef(0);
   const [landfills, setLandfills] = useState([]);
   const [selectedMarker, setSelectedMarker] = useState(null);
   const [addingMarker, setAddingMarker] = useState(false);
@@ -132,21 +136,12 @@ function App() {
 
   const fetchRentalNotes = async () => {
     try {
-      const response = await axios.get(`${API}/rental-notes/with-status`);
-      setRentalNotes(response.data);
+      // One request returns every note grouped by color status
+      const response = await axios.get(`${API}/rental-notes/board`);
+      const { green, yellow, purple, red } = response.data.buckets;
+      const byCreatedAt = (a, b) => new Date(a.created_at) - new Date(b.created_at);
       
-      // Also fetch separated lists
-      const activeResponse = await axios.get(`${API}/rental-notes/active`);
-      setActiveRentals(activeResponse.data);
-      
-      const retrievedResponse = await axios.get(`${API}/rental-notes/retrieved`);
-      setRetrievedRentals(retrievedResponse.data);
-      
-      const overdueResponse = await axios.get(`${API}/rental-notes/overdue`);
-      setOverdueRentals(overdueResponse.data);
-      
-      const expiredResponse = await axios.get(`${API}/rental-notes/expired`);
-      setExpiredRentals(expiredResponse.data);
+      setRentalNotes([...green, ...yellow, ...purple, ...red].sort(byCreatedAt));
     } catch (error) {
       console.error('Erro ao buscar notas de locação:', error);
     }
@@ -184,9 +179,12 @@ function App() {
       let url = `${API}/financial/monthly-summary`;
       if (startDate && endDate) {
         // Use the detailed report endpoint for custom date ranges
-        const response = await axios.post(`${API}/reports/detailed`, {
-          start_date: new Date(startDate).toISOString(),
-          end_date: new Date(endDate).toISOString()
+        // GET so the browser revalidates an unchanged report with its ETag
+        const response = await axios.get(`${API}/reports/detailed`, {
+          params: {
+            start_date: new Date(startDate).toISOString(),
+            end_date: new Date(endDate).toISOString()
+          }
         });
         
         const reportData = response.data;
@@ -212,18 +210,36 @@ function App() {
   };
 
   const fetchMapData = async () => {
+    // Zoomed out the map shows clusters; markers are only loaded for the visible area
+    const viewport = mapViewport.current;
+    if (!viewport || viewport.zoom < CLUSTER_MAX_ZOOM) {
+      return;
+    }
+    const request = ++mapDataRequest.current;
     try {
-      const response = await axios.get(`${API}/rental-notes/map-data`);
-      setMapData(response.data);
+      const response = await axios.get(`${API}/rental-notes/map-data`, { params: { bbox: viewport.bbox } });
+      if (request === mapDataRequest.current) {
+        setMapData(response.data);
+      }
     } catch (error) {
       console.error('Erro ao buscar dados do mapa:', error);
     }
   };
 
+  const handleMapViewportChange = (zoom, bbox) => {
+    mapViewport.current = { zoom, bbox };
+    fetchMapData();
+  };
+
+  const fetchMapClusters = async (zoom, bbox) => {
+    const response = await axios.get(`${API}/rental-notes/map-clusters`, { params: { zoom, bbox } });
+    return response.data.clusters;
+  };
+
   const updateRentalCoordinates = async (noteId, latitude, longitude) => {
     try {
       await axios.put(`${API}/rental-notes/${noteId}/coordinates?latitude=${latitude}&longitude=${longitude}`);
-      fetchMapData(); // Refresh map data
+      refreshUnlessLive(fetchMapData); // Refresh map data
     } catch (error) {
       console.error('Erro ao atualizar coordenadas:', error);
     }
@@ -247,6 +263,76 @@ function App() {
     }
   };
 
+  // Live updates: the server pushes changed documents, so lists are patched
+  // in place instead of refetched after every action
+  const liveUpdates = useRef(false);
+  const connectedOnce = useRef(false);
+  const statsRefreshTimer = useRef(null);
+
+  // Bulk imports and backfills push thousands of events; refetch the
+  // dashboard stats once per burst instead of once per event
+  const scheduleStatsRefresh = () => {
+    if (statsRefreshTimer.current) {
+      return;
+    }
+    statsRefreshTimer.current = setTimeout(() => {
+      statsRefreshTimer.current = null;
+      fetchDashboardStats();
+    }, STATS_REFRESH_DELAY);
+  };
+
+  const refreshUnlessLive = (...fetchers) => {
+    if (!liveUpdates.current) {
+      fetchers.forEach(fetcher => fetcher());
+    }
+  };
+
+  const upsertById = (items, document) => {
+    const index = items.findIndex(item => item.id === document.id);
+    if (index === -1) {
+      return [...items, document];
+    }
+    const updated = [...items];
+    updated[index] = document;
+    return updated;
+  };
+
+  const applyChange = (change) => {
+    const reloaders = {
+      rental_notes: [fetchRentalNotes, fetchMapData, scheduleStatsRefresh],
+      payments: [fetchPayments],
+      receivables: [fetchReceivables]
+    };
+    if (change.op === 'reset') {
+      const collections = change.collection ? [change.collection] : Object.keys(reloaders);
+      collections.forEach(collection => reloaders[collection].forEach(fetcher => fetcher()));
+      return;
+    }
+    
+    const apply = (items) => change.op === 'delete'
+      ? items.filter(item => item.id !== change.id)
+      : upsertById(items, change.document);
+    
+    if (change.collection === 'rental_notes') {
+      setRentalNotes(apply);
+      setMapData(items => change.op !== 'delete' && change.document.latitude != null && change.document.longitude != null
+        ? upsertById(items, change.document)
+        : items.filter(item => item.id !== change.id));
+      scheduleStatsRefresh();
+    } else if (change.collection === 'payments') {
+      setPayments(apply);
+    } else if (change.collection === 'receivables') {
+      setReceivables(apply);
+    }
+  };
+
+  useEffect(() => {
+    setActiveRentals(rentalNotes.filter(note => note.color_status !== 'red'));
+    setRetrievedRentals(rentalNotes.filter(note => note.color_status === 'red'));
+    setOverdueRentals(rentalNotes.filter(note => note.color_status === 'purple'));
+    setExpiredRentals(rentalNotes.filter(note => note.color_status === 'yellow'));
+  }, [rentalNotes]);
+
   useEffect(() => {
     fetchClients();
     fetchDumpsterTypes();
@@ -258,6 +344,24 @@ function App() {
     fetchMapData();
     fetchLandfills();
     fetchRoutes();
+    
+    const events = new EventSource(`${API}/events`);
+    events.onopen = () => {
+      // Changes made while disconnected were missed
+      if (connectedOnce.current) {
+        applyChange({ collection: null, op: 'reset' });
+      }
+      connectedOnce.current = true;
+      liveUpdates.current = true;
+    };
+    events.onerror = () => {
+      liveUpdates.current = false;
+    };
+    events.addEventListener('change', (event) => applyChange(JSON.parse(event.data)));
+    return () => {
+      events.close();
+      clearTimeout(statsRefreshTimer.current);
+    };
   }, []);
 
   // Create functions
@@ -332,8 +436,7 @@ function App() {
     
     try {
       await axios.delete(`${API}/rental-notes/${noteId}`);
-      fetchRentalNotes();
-      fetchDashboardStats();
+      refreshUnlessLive(fetchRentalNotes, fetchDashboardStats);
       alert('Nota excluída com sucesso!');
     } catch (error) {
       console.error('Erro ao excluir nota:', error);
@@ -402,12 +505,10 @@ function App() {
         use_unregistered_client: false
       });
       setRentalDialog(false);
-      fetchRentalNotes();
-      fetchDashboardStats();
-      fetchMapData(); // Update map data when new rental is created
+      refreshUnlessLive(fetchRentalNotes, fetchDashboardStats, fetchMapData);
     } catch (error) {
       console.error('Erro ao criar nota de locação:', error);
-      alert('Erro ao criar locação');
+      alert(error.response?.data?.detail || 'Erro ao criar locação');
     } finally {
       setLoading(false);
     }
@@ -498,7 +599,7 @@ function App() {
         description: ''
       });
       setPaymentDialog(false);
-      fetchPayments();
+      refreshUnlessLive(fetchPayments);
       fetchMonthlyFinancial();
     } catch (error) {
       console.error('Erro ao criar pagamento:', error);
@@ -529,8 +630,7 @@ function App() {
   const markAsRetrieved = async (noteId) => {
     try {
       await axios.put(`${API}/rental-notes/${noteId}/retrieve`);
-      fetchRentalNotes();
-      fetchDashboardStats();
+      refreshUnlessLive(fetchRentalNotes, fetchDashboardStats);
     } catch (error) {
       console.error('Erro ao marcar como retirada:', error);
     }
@@ -539,10 +639,8 @@ function App() {
   const markAsPaid = async (noteId) => {
     try {
       await axios.put(`${API}/rental-notes/${noteId}/pay`);
-      fetchRentalNotes();
-      fetchReceivables();
+      refreshUnlessLive(fetchRentalNotes, fetchReceivables, fetchDashboardStats);
       fetchMonthlyFinancial();
-      fetchDashboardStats();
       alert('Caçamba marcada como paga e recebimento registrado automaticamente!');
     } catch (error) {
       console.error('Erro ao marcar como paga:', error);
@@ -567,9 +665,11 @@ function App() {
 
     try {
       setLoading(true);
-      const response = await axios.post(`${API}/reports/detailed`, {
-        start_date: new Date(reportDates.start_date).toISOString(),
-        end_date: new Date(reportDates.end_date).toISOString()
+      const response = await axios.get(`${API}/reports/detailed`, {
+        params: {
+          start_date: new Date(reportDates.start_date).toISOString(),
+          end_date: new Date(reportDates.end_date).toISOString()
+        }
       });
 
       const reportData = response.data;
@@ -699,6 +799,13 @@ function App() {
     }
   };
 
+  // Ranked server results on top, then the substring matches they missed
+  // (the server returns only its top 50 prefix matches)
+  const rankedFirst = (ranked, localMatches) => {
+    const rankedIds = new Set(ranked.map(item => item.id));
+    return [...ranked, ...localMatches.filter(item => !rankedIds.has(item.id))];
+  };
+
   const filteredRentals = () => {
     let rentalsToFilter = rentalNotes;
     
@@ -708,19 +815,59 @@ function App() {
       rentalsToFilter = retrievedRentals;
     }
     
-    return rentalsToFilter.filter(rental => 
+    const localMatches = rentalsToFilter.filter(rental => 
       rental.client_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
       rental.client_address.toLowerCase().includes(searchTerm.toLowerCase()) ||
       rental.dumpster_code.toLowerCase().includes(searchTerm.toLowerCase())
     );
+    if (!searchResults) {
+      return localMatches;
+    }
+    
+    const byId = new Map(rentalsToFilter.map(rental => [rental.id, rental]));
+    const ranked = searchResults.rental_notes.map(result => byId.get(result.id)).filter(Boolean);
+    return rankedFirst(ranked, localMatches);
   };
 
-  const filteredClients = clients.filter(client =>
+  useEffect(() => {
+    setSearchResults(null);
+    if (searchTerm.trim().length < 2) {
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/search`, { params: { q: searchTerm, limit: 50 } });
+        if (!cancelled) {
+          setSearchResults(response.data);
+        }
+      } catch (error) {
+        console.error('Erro na busca:', error);
+      }
+    }, 250);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm]);
+
+  const localClientMatches = clients.filter(client =>
     client.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
     client.address.toLowerCase().includes(searchTerm.toLowerCase()) ||
     (client.phone && client.phone.toLowerCase().includes(searchTerm.toLowerCase())) ||
     (client.cpf_cnpj && client.cpf_cnpj.toLowerCase().includes(searchTerm.toLowerCase()))
   );
+  const filteredClients = searchResults
+    ? rankedFirst(
+        searchResults.clients.map(result => clients.find(client => client.id === result.id) || result),
+        localClientMatches
+      )
+    : localClientMatches;
+
+  // Legend counts cover the whole fleet, not only the markers in view
+  const hasCoordinates = (note) => note.latitude != null && note.longitude != null;
+  const locatedRentals = rentalNotes.filter(hasCoordinates);
+  const unlocatedRentals = rentalNotes.filter(note => !hasCoordinates(note));
 
   const openPriceDialog = (dumpsterType) => {
     setSelectedDumpsterType(dumpsterType);
@@ -1403,28 +1550,28 @@ function App() {
                   <div className="flex items-center space-x-2">
                     <div className="w-4 h-4 bg-green-500 rounded-full"></div>
                     <div>
-                      <div className="font-medium">{mapData.filter(r => r.color_status === 'green').length}</div>
+                      <div className="font-medium">{locatedRentals.filter(r => r.color_status === 'green').length}</div>
                       <div className="text-xs text-gray-600">No Prazo</div>
                     </div>
                   </div>
                   <div className="flex items-center space-x-2">
                     <div className="w-4 h-4 bg-yellow-500 rounded-full"></div>
                     <div>
-                      <div className="font-medium">{mapData.filter(r => r.color_status === 'yellow').length}</div>
+                      <div className="font-medium">{locatedRentals.filter(r => r.color_status === 'yellow').length}</div>
                       <div className="text-xs text-gray-600">Vencidas</div>
                     </div>
                   </div>
                   <div className="flex items-center space-x-2">
                     <div className="w-4 h-4 bg-red-500 rounded-full"></div>
                     <div>
-                      <div className="font-medium">{mapData.filter(r => r.color_status === 'red').length}</div>
+                      <div className="font-medium">{locatedRentals.filter(r => r.color_status === 'red').length}</div>
                       <div className="text-xs text-gray-600">Retiradas</div>
                     </div>
                   </div>
                   <div className="flex items-center space-x-2">
                     <div className="w-4 h-4 bg-purple-500 rounded-full"></div>
                     <div>
-                      <div className="font-medium">{mapData.filter(r => r.color_status === 'purple').length}</div>
+                      <div className="font-medium">{locatedRentals.filter(r => r.color_status === 'purple').length}</div>
                       <div className="text-xs text-gray-600">Abandonadas</div>
                     </div>
                   </div>
@@ -1457,6 +1604,8 @@ function App() {
                     newMarkerPos={newMarkerPos}
                     onMapClick={handleMapClick}
                     onMarkerConfirm={handleMarkerConfirm}
+                    fetchClusters={fetchMapClusters}
+                    onViewportChange={handleMapViewportChange}
                     selectedRoute={null}
                     routeWaypoints={routeWaypoints}
                     showRoute={showRoute}
@@ -1490,7 +1639,7 @@ function App() {
               </CardHeader>
               <CardContent>
                 <div className="space-y-3">
-                  {rentalNotes.filter(note => !mapData.some(mapItem => mapItem.id === note.id)).slice(0, 10).map((rental) => (
+                  {unlocatedRentals.slice(0, 10).map((rental) => (
                     <div key={rental.id} className="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
                       <div>
                         <p className="font-medium">Caçamba {rental.dumpster_code}</p>
@@ -1509,7 +1658,7 @@ function App() {
                       </Button>
                     </div>
                   ))}
-                  {rentalNotes.filter(note => !mapData.some(mapItem => mapItem.id === note.id)).length === 0 && (
+                  {unlocatedRentals.length === 0 && (
                     <p className="text-gray-500 text-center py-4">Todas as caçambas estão localizadas no mapa! 🎉</p>
                   )}
                 </div>
@@ -4,6 +4,9 @@ import { Button } from './ui/button';
 import { Input } from './ui/input';
 import { Badge } from './ui/badge';
 
+// Below this zoom level markers are replaced by server-side clusters
+export const CLUSTER_MAX_ZOOM = 13;
+
 // Simple stable map component
 const RealMap = ({ 
   mapData, 
@@ -11,13 +14,16 @@ const RealMap = ({
   addingMarker, 
   newMarkerPos, 
   onMapClick, 
-  onMarkerConfirm
+  onMarkerConfirm,
+  fetchClusters,
+  onViewportChange
 }) => {
   const mapRef = useRef(null);
   const mapInstanceRef = useRef(null);
   const markersRef = useRef([]);
   const [searchQuery, setSearchQuery] = useState('');
   const [searchResults, setSearchResults] = useState([]);
+  const [clusters, setClusters] = useState(null);
 
   useEffect(() => {
     // Initialize map only once
@@ -34,6 +40,28 @@ const RealMap = ({
           onMapClick({ lat: e.latlng.lat, lng: e.latlng.lng });
         }
       });
+
+      // Load clusters for the visible area when zoomed out, markers otherwise
+      const loadViewport = async () => {
+        const map = mapInstanceRef.current;
+        if (!map) return;
+        const zoom = map.getZoom();
+        const bbox = map.getBounds().toBBoxString();
+        if (onViewportChange) {
+          onViewportChange(zoom, bbox);
+        }
+        if (!fetchClusters || zoom >= CLUSTER_MAX_ZOOM) {
+          setClusters(null);
+          return;
+        }
+        try {
+          setClusters(await fetchClusters(zoom, bbox));
+        } catch (error) {
+          setClusters(null);
+        }
+      };
+      mapInstanceRef.current.on('moveend', loadViewport);
+      loadViewport();
     }
 
     return () => {
@@ -56,35 +84,58 @@ const RealMap = ({
     });
     markersRef.current = [];
 
-    // Add dumpster markers
-    mapData.forEach(rental => {
-      const color = getMarkerColor(rental.color_status);
-      const marker = L.circleMarker([rental.latitude, rental.longitude], {
-        radius: 8,
-        fillColor: color,
-        color: '#fff',
-        weight: 2,
-        opacity: 1,
-        fillOpacity: 0.8
+    // Add cluster markers when zoomed out, dumpster markers otherwise
+    if (clusters) {
+      clusters.forEach(cluster => {
+        const dominant = Object.entries(cluster.color_counts).sort((a, b) => b[1] - a[1])[0][0];
+        const size = Math.min(48, 20 + Math.round(Math.log2(cluster.count) * 4));
+        const marker = L.marker([cluster.latitude, cluster.longitude], {
+          icon: L.divIcon({
+            html: `<div style="background: ${getMarkerColor(dominant)}; color: white; width: ${size}px; height: ${size}px; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-size: 12px; font-weight: bold; border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3);">${cluster.count}</div>`,
+            className: 'custom-cluster-marker',
+            iconSize: [size, size],
+            iconAnchor: [size / 2, size / 2],
+          })
+        });
+
+        // Zoom into the cluster on click
+        marker.on('click', () => {
+          mapInstanceRef.current.setView([cluster.latitude, cluster.longitude], mapInstanceRef.current.getZoom() + 2);
+        });
+
+        marker.addTo(mapInstanceRef.current);
+        markersRef.current.push(marker);
       });
+    } else {
+      mapData.forEach(rental => {
+        const color = getMarkerColor(rental.color_status);
+        const marker = L.circleMarker([rental.latitude, rental.longitude], {
+          radius: 8,
+          fillColor: color,
+          color: '#fff',
+          weight: 2,
+          opacity: 1,
+          fillOpacity: 0.8
+        });
 
-      marker.bindPopup(`
-        <div class="p-2">
-          <h3 class="font-bold mb-2">🚛 Caçamba ${rental.dumpster_code}</h3>
-          <p><strong>Cliente:</strong> ${rental.client_name}</p>
-          <p><strong>Endereço:</strong> ${rental.client_address}</p>
-          <p><strong>Tamanho:</strong> ${rental.dumpster_size}</p>
-          <p><strong>Data:</strong> ${new Date(rental.rental_date).toLocaleDateString('pt-BR')}</p>
-          <p><strong>Valor:</strong> R$ ${rental.price.toFixed(2)}</p>
-          <p><strong>Status:</strong> ${getStatusText(rental.color_status, rental.status)}</p>
-          ${rental.is_paid ? '<p class="text-green-600">✅ Pago</p>' : ''}
-          ${rental.description ? `<p class="text-xs mt-2"><strong>Obs:</strong> ${rental.description}</p>` : ''}
-        </div>
-      `);
+        marker.bindPopup(`
+          <div class="p-2">
+            <h3 class="font-bold mb-2">🚛 Caçamba ${rental.dumpster_code}</h3>
+            <p><strong>Cliente:</strong> ${rental.client_name}</p>
+            <p><strong>Endereço:</strong> ${rental.client_address}</p>
+            <p><strong>Tamanho:</strong> ${rental.dumpster_size}</p>
+            <p><strong>Data:</strong> ${new Date(rental.rental_date).toLocaleDateString('pt-BR')}</p>
+            <p><strong>Valor:</strong> R$ ${rental.price.toFixed(2)}</p>
+            <p><strong>Status:</strong> ${getStatusText(rental.color_status, rental.status)}</p>
+            ${rental.is_paid ? '<p class="text-green-600">✅ Pago</p>' : ''}
+            ${rental.description ? `<p class="text-xs mt-2"><strong>Obs:</strong> ${rental.description}</p>` : ''}
+          </div>
+        `);
 
-      marker.addTo(mapInstanceRef.current);
-      markersRef.current.push(marker);
-    });
+        marker.addTo(mapInstanceRef.current);
+        markersRef.current.push(marker);
+      });
+    }
 
     // Add landfill markers
     landfills.forEach(landfill => {
@@ -140,7 +191,7 @@ const RealMap = ({
       markersRef.current.push(marker);
     }
 
-  }, [mapData, landfills, newMarkerPos]);
+  }, [mapData, clusters, landfills, newMarkerPos]);
 
   const getMarkerColor = (colorStatus) => {
     switch (colorStatus) {
@@ -0,0 +1,30 @@
+import pytest
+
+from server import geocode_cache_key, normalize_address
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("Rua 13 de Maio, 100", ("rua 13 de maio", 100)),
+    ("Rua 15 de Novembro, 200", ("rua 15 de novembro", 200)),
+    ("Av. 7 de Setembro 45", ("avenida 7 de setembro", 45)),
+    ("Rua 9 de Julho, 12 - apto 3", ("rua 9 de julho", 12)),
+    ("R. Dr. João Silva, nº 123 - Centro", ("rua doutor joao silva", 123)),
+    ("Rua Sete de Setembro n° 12", ("rua sete de setembro", 12)),
+    ("Rua Cel. Francisco Vieira - 300", ("rua coronel francisco vieira", 300)),
+    ("Av. Rio Branco, 1500, Centro", ("avenida rio branco", 1500)),
+    ("Av. Brasil, 1.500", ("avenida brasil", 1500)),
+    ("Av. Brasil nº 1.500", ("avenida brasil", 1500)),
+    ("Praça Bernardino de Campos, s/n", ("praca bernardino de campos", None)),
+    ("Rua 13 de Maio", ("rua 13 de maio", None)),
+    ("Rua 25", ("rua 25", None)),
+])
+def test_normalize_address(address, expected):
+    assert normalize_address(address) == expected
+
+
+def test_numbered_streets_do_not_share_cache_keys():
+    keys = {
+        geocode_cache_key(*normalize_address(address))
+        for address in ("Rua 13 de Maio, 100", "Rua 13 de Junho, 250", "Rua 15 de Novembro, 13")
+    }
+    assert len(keys) == 3
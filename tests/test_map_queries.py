@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from server import RentalNoteCreate, map_data_query, wrap_longitude
+
+
+def polygon(query):
+    return query["location"]["$geoWithin"]["$geometry"]["coordinates"][0]
+
+
+def test_bbox_polygon():
+    assert polygon(map_data_query(bbox="-46.9,-22.5,-46.7,-22.3"))[:3] == [
+        [-46.9, -22.5], [-46.7, -22.5], [-46.7, -22.3]
+    ]
+
+
+def test_world_wide_bbox_is_not_a_polygon():
+    assert map_data_query(bbox="-400,-100,400,100") == {"latitude": {"$ne": None}, "longitude": {"$ne": None}}
+
+
+def test_bbox_is_wrapped_and_clamped():
+    west_south, east_south, east_north, _, _ = polygon(map_data_query(bbox="170,-95,190,10"))
+    assert west_south[0] == 170 and east_south[0] == -170
+    assert -90 < west_south[1] and east_north[1] == 10
+
+
+@pytest.mark.parametrize("bbox", ["nan,1,2,3", "1,2,3", "2,1,1,3", "1,95,2,99"])
+def test_invalid_bbox(bbox):
+    with pytest.raises(HTTPException) as error:
+        map_data_query(bbox=bbox)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("near", ["95,10", "10,200", "inf,0"])
+def test_invalid_near(near):
+    with pytest.raises(HTTPException) as error:
+        map_data_query(near=near)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("latitude, longitude", [(91, 0), (0, 181), (float("nan"), 0), (0, float("nan"))])
+def test_rental_note_coordinates_in_range(latitude, longitude):
+    with pytest.raises(ValidationError):
+        RentalNoteCreate(client_name="Cliente", client_address="Rua A, 1", dumpster_code="CX-1",
+                         dumpster_size="Grande", rental_date="2024-01-01T00:00:00+00:00", price=300,
+                         latitude=latitude, longitude=longitude)
+
+
+@pytest.mark.parametrize("longitude, expected", [(-46.8, -46.8), (313.2, -46.8), (-406.8, -46.8), (180, 180)])
+def test_wrap_longitude(longitude, expected):
+    assert wrap_longitude(longitude) == pytest.approx(expected)
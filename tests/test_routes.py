@@ -0,0 +1,69 @@
+import random
+import time
+
+import pytest
+
+from server import ROUTE_OPTIMIZATION_BUDGET, haversine_matrix, optimize_path, plan_route
+
+DEPOT = (-22.4386, -46.8289)
+LANDFILL = (-22.4700, -46.8100)
+
+
+def random_stops(count, seed=42):
+    rng = random.Random(seed)
+    return [(DEPOT[0] + rng.uniform(-0.05, 0.05), DEPOT[1] + rng.uniform(-0.05, 0.05)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("count", [2, 5, 20])
+@pytest.mark.parametrize("end", [LANDFILL, None])
+def test_order_is_a_permutation_of_the_stops(count, end):
+    order, _, arrivals, _ = plan_route(DEPOT, random_stops(count), end)
+    assert sorted(order) == list(range(count))
+    assert len(arrivals) == count
+
+
+@pytest.mark.parametrize("count", [3, 10, 40])
+def test_start_and_end_stay_fixed(count):
+    points = [DEPOT, *random_stops(count), LANDFILL]
+    dist = haversine_matrix([p[0] for p in points], [p[1] for p in points])
+    path = optimize_path(dist)
+    assert path[0] == 0 and path[-1] == len(points) - 1
+    assert sorted(path.tolist()) == list(range(len(points)))
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("end", [LANDFILL, None])
+def test_optimized_route_is_never_longer(seed, end):
+    stops = random_stops(25, seed)
+    _, optimized, _, _ = plan_route(DEPOT, stops, end)
+    _, given, _, _ = plan_route(DEPOT, stops, end, optimize=False)
+    assert optimized <= given
+
+
+def test_no_stops():
+    order, distance, arrivals, duration = plan_route(DEPOT, [], LANDFILL)
+    assert order == [] and arrivals == []
+    assert distance > 0 and duration > 0
+
+
+def test_one_stop():
+    order, distance, arrivals, _ = plan_route(DEPOT, [LANDFILL], None)
+    assert order == [0] and len(arrivals) == 1
+    # A free end adds no distance after the last stop
+    assert distance == pytest.approx(haversine_matrix([DEPOT[0], LANDFILL[0]], [DEPOT[1], LANDFILL[1]])[0, 1], abs=0.01)
+
+
+def test_free_end_is_not_longer_than_returning():
+    stops = random_stops(15)
+    _, free, _, _ = plan_route(DEPOT, stops, None)
+    _, returning, _, _ = plan_route(DEPOT, stops, DEPOT)
+    assert free <= returning
+
+
+def test_large_route_within_budget():
+    stops = random_stops(150)
+    started = time.monotonic()
+    order, _, _, _ = plan_route(DEPOT, stops, LANDFILL)
+    # The budget bounds the improvement loop; allow for the seed and one pass in flight
+    assert time.monotonic() - started < ROUTE_OPTIMIZATION_BUDGET + 0.5
+    assert sorted(order) == list(range(150))